@@ -1,10 +1,24 @@
 import os
 import json
-from datetime import datetime, timedelta
-from typing import List, Dict, Any, Optional
+import asyncio
+import copy
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Dict, Any, AsyncIterator, Optional, Tuple, get_type_hints
+from typing_extensions import TypedDict
+import httpx
+import numpy as np
 import google.generativeai as genai
+from google.api_core.exceptions import GoogleAPIError
+from google.generativeai.types.generation_types import (
+    BlockedPromptException, StopCandidateException, to_generation_config_dict
+)
 from dotenv import load_dotenv
-import requests
+from .engagement_matrix import POSTING_TIMEZONE, EngagementMatrix
+from .http_client import GRAPH_API_URL, close_http_client, get_http_client
+from .hashtag_matcher import HashtagMatcher
+from .history_store import HistoryStore, get_history_store
+from .instagram_ingester import MEDIA_FIELDS, EngagementStore, get_engagement_store, normalize_media
+from .ttl_cache import TTLCache
 
 load_dotenv()
 
@@ -15,23 +29,224 @@ if not api_key:
 
 genai.configure(api_key=api_key)
 
+# Per-source deadlines (seconds) for the concurrent analysis mode
+INSTAGRAM_TIMEOUT = float(os.getenv("BEST_TIME_INSTAGRAM_TIMEOUT", "5"))
+GEMINI_TIMEOUT = float(os.getenv("BEST_TIME_GEMINI_TIMEOUT", "12"))
+HISTORY_TIMEOUT = float(os.getenv("BEST_TIME_HISTORY_TIMEOUT", "2"))
+
+# Maximum concurrent Gemini calls in batch analysis
+BATCH_CONCURRENCY = int(os.getenv("BEST_TIME_BATCH_CONCURRENCY", "8"))
+
+class GeminiInsights(TypedDict):
+    """
+    Structured Gemini analysis - exactly the fields compute_best_time reads.
+    typing_extensions.TypedDict: pydantic rejects typing.TypedDict before 3.12.
+    """
+    best_days: List[str]
+    best_time_slots: List[str]
+    target_states: List[str]
+    season_spike: List[str]
+    festivals: List[str]
+    expected_demand_boost: str
+    reasoning: str
+
+
+# No output cap by default - a truncated response is not valid JSON
+GEMINI_MAX_OUTPUT_TOKENS = os.getenv("GEMINI_MAX_OUTPUT_TOKENS")
+
+# Converted once at import, so a schema the SDK can't handle fails at startup
+# instead of turning every request into the fallback
+GEMINI_GENERATION_CONFIG = to_generation_config_dict(genai.GenerationConfig(
+    response_mime_type="application/json",
+    response_schema=GeminiInsights,
+    max_output_tokens=int(GEMINI_MAX_OUTPUT_TOKENS) if GEMINI_MAX_OUTPUT_TOKENS else None
+))
+
+# Failures of the Gemini call itself (API, network, blocked or malformed
+# responses) fall back to default insights; anything else is a bug and raises
+GEMINI_CALL_ERRORS = (GoogleAPIError, OSError, ValueError, BlockedPromptException, StopCandidateException)
+
+
+def parse_gemini_insights(text: str) -> GeminiInsights:
+    """
+    Parse a Gemini response into GeminiInsights, keeping only the schema's
+    fields and checking their types
+
+    Raises:
+        ValueError: invalid JSON, or a field is missing or has the wrong type
+    """
+    data = json.loads(text)
+    if not isinstance(data, dict):
+        raise ValueError("Gemini response is not a JSON object")
+
+    insights = {}
+    for field, field_type in get_type_hints(GeminiInsights).items():
+        value = data.get(field)
+        if field_type is str:
+            valid = isinstance(value, str)
+        else:
+            valid = isinstance(value, list) and all(isinstance(item, str) for item in value)
+        if not valid:
+            raise ValueError(f"Gemini response field '{field}' is missing or malformed")
+        insights[field] = value
+    return insights
+
+# Shared cache of Gemini analyses keyed on normalized (product, category, keywords)
+gemini_cache = TTLCache(
+    maxsize=int(os.getenv("GEMINI_CACHE_SIZE", "512")),
+    ttl=float(os.getenv("GEMINI_CACHE_TTL", "21600"))
+)
+
+
+def gemini_cache_key(product_name: str, category: str, keywords: List[str]) -> tuple:
+    """
+    Normalize analysis inputs so that case, spacing and keyword order don't split the cache
+    """
+    def normalize(text: str) -> str:
+        return " ".join(text.lower().split())
+
+    return (
+        normalize(product_name),
+        normalize(category),
+        tuple(sorted({normalize(keyword) for keyword in keywords if keyword.strip()}))
+    )
+
+
+def run_sync(coroutine):
+    """
+    Run a coroutine to completion from blocking code. Inside a running event
+    loop it is run on a fresh loop in a worker thread instead.
+    """
+    async def run_and_close():
+        try:
+            return await coroutine
+        finally:
+            # The loop dies with this call, so its pooled client goes too
+            await close_http_client()
+
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        return asyncio.run(run_and_close())
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        return executor.submit(asyncio.run, run_and_close()).result()
+
 
 class BestTimeAnalyzer:
     """
     Analyzes best time to post using:
     1. Instagram Graph API engagement data
     2. Gemini AI for seasonal/cultural insights
-    3. Firestore historical data
+    3. Engagement history of our own posts (local history store)
     """
     
-    def __init__(self):
+    def __init__(
+        self,
+        engagement_store: Optional[EngagementStore] = None,
+        history_store: Optional[HistoryStore] = None,
+        gemini_model: Optional[genai.GenerativeModel] = None,
+        http_client: Optional[httpx.AsyncClient] = None
+    ):
+        self.engagement_store = engagement_store or get_engagement_store()
+        self.history_store = history_store or get_history_store()
         self.instagram_access_token = os.getenv("INSTAGRAM_ACCESS_TOKEN")
         self.instagram_business_account_id = os.getenv("INSTAGRAM_BUSINESS_ACCOUNT_ID")
-        self.gemini_model = genai.GenerativeModel('gemini-2.0-flash-exp')
+        self.gemini_model = gemini_model or genai.GenerativeModel('gemini-2.0-flash-exp')
+        # None means the shared pooled client of the running event loop
+        self.http_client = http_client
+    
+    @staticmethod
+    def instagram_fallback(error: str) -> Dict[str, Any]:
+        """
+        Default engagement estimates used when Instagram data is unavailable
+        """
+        return {
+            "peak_times": ["18:00-19:00", "19:00-20:00", "20:00-21:00"],
+            "best_days": ["Friday", "Saturday", "Sunday"],
+            "avg_engagement_rate": 0.045,
+            "engagement_metrics": {
+                "avg_likes": 150,
+                "avg_comments": 25,
+                "error": error
+            },
+            "source": "fallback_estimate"
+        }
+    
+    @staticmethod
+    def gemini_fallback(category: str, error: str) -> Dict[str, Any]:
+        """
+        Default seasonal analysis used when Gemini is unavailable
+        """
+        return {
+            "season_spike": ["Diwali", "Holi"],
+            "best_months": ["October", "November", "March"],
+            "target_states": ["Maharashtra", "Gujarat", "Rajasthan"],
+            "festivals": ["Diwali", "Ganesh Chaturthi"],
+            "best_days": ["Friday", "Saturday", "Sunday"],
+            "best_time_slots": ["6:00pm-9:00pm", "11:00am-1:00pm"],
+            "reasoning": f"Traditional/artisan products like {category} typically see demand during festival seasons.",
+            "expected_demand_boost": "+50-70%",
+            "cultural_insights": "Cultural products align with festival preparations and gifting seasons",
+            "error": error
+        }
     
-    def fetch_instagram_engagement(self, category: str, hashtags: List[str]) -> Dict[str, Any]:
+    @staticmethod
+    def history_fallback(error: str) -> Dict[str, Any]:
         """
-        Fetch engagement metrics from Instagram Graph API
+        Empty history used when historical data is unavailable
+        """
+        return {
+            "past_performance": {},
+            "error": error
+        }
+    
+    async def fetch_instagram_media(self) -> Tuple[Optional[List[Dict[str, Any]]], str]:
+        """
+        Load account-level media rows, from the local engagement store or from
+        the Instagram Graph API when the store has not been populated yet
+        
+        Returns:
+            (normalized media rows, source). Rows are None when no Instagram
+            credentials are configured.
+        """
+        # Ingested media - no network I/O on the request path
+        if await asyncio.to_thread(self.engagement_store.count) > 0:
+            return await asyncio.to_thread(self.engagement_store.load_media), "engagement_store"
+        
+        if not self.instagram_access_token or not self.instagram_business_account_id:
+            return None, "default_estimate"
+        
+        # Instagram Graph API endpoint for insights
+        base_url = f"{GRAPH_API_URL}/{self.instagram_business_account_id}"
+        
+        # Get recent media insights
+        media_endpoint = f"{base_url}/media"
+        media_params = {
+            "fields": MEDIA_FIELDS,
+            "access_token": self.instagram_access_token,
+            "limit": 50
+        }
+        
+        client = self.http_client or get_http_client()
+        response = await client.get(media_endpoint, params=media_params)
+        
+        if response.status_code != 200:
+            raise Exception(f"Instagram API error: {response.text}")
+        
+        return [normalize_media(post) for post in response.json().get("data", [])], "instagram_graph_api"
+    
+    async def fetch_instagram_engagement(
+        self,
+        category: str,
+        hashtags: List[str],
+        media: Optional[Tuple[Optional[List[Dict[str, Any]]], str]] = None
+    ) -> Dict[str, Any]:
+        """
+        Fetch engagement metrics for the category's hashtags
+        
+        Args:
+            media: Pre-fetched result of fetch_instagram_media, shared across
+                   products in batch analysis
         
         Returns engagement data including:
         - Peak posting times
@@ -39,7 +254,9 @@ class BestTimeAnalyzer:
         - Best performing days
         """
         try:
-            if not self.instagram_access_token or not self.instagram_business_account_id:
+            media_data, source = media if media is not None else await self.fetch_instagram_media()
+            
+            if media_data is None:
                 return {
                     "peak_times": ["Friday-Sunday 7:00pm-10:00pm"],
                     "best_days": ["Friday", "Saturday", "Sunday"],
@@ -50,215 +267,104 @@ class BestTimeAnalyzer:
                         "avg_shares": 10,
                         "avg_saves": 35
                     },
-                    "source": "default_estimate"
+                    "source": source
                 }
             
-            # Instagram Graph API endpoint for insights
-            base_url = f"https://graph.facebook.com/v18.0/{self.instagram_business_account_id}"
-            
-            # Get recent media insights
-            media_endpoint = f"{base_url}/media"
-            media_params = {
-                "fields": "id,caption,like_count,comments_count,timestamp,media_type,insights.metric(impressions,reach,saved)",
-                "access_token": self.instagram_access_token,
-                "limit": 50
-            }
-            
-            response = requests.get(media_endpoint, params=media_params)
-            
-            if response.status_code != 200:
-                raise Exception(f"Instagram API error: {response.text}")
-            
-            media_data = response.json().get("data", [])
-            
-            # Analyze engagement patterns
-            engagement_by_hour = {}
-            engagement_by_day = {}
-            total_engagement = 0
-            total_posts = len(media_data)
-            
-            for post in media_data:
-                # Check if post matches category/hashtags
-                caption = post.get("caption", "").lower()
-                matches_category = any(tag.lower() in caption for tag in hashtags)
-                
-                if matches_category or not hashtags:
-                    timestamp = datetime.fromisoformat(post.get("timestamp", "").replace("Z", "+00:00"))
-                    hour = timestamp.hour
-                    day = timestamp.strftime("%A")
-                    
-                    likes = post.get("like_count", 0)
-                    comments = post.get("comments_count", 0)
-                    
-                    # Get insights if available
-                    insights = post.get("insights", {}).get("data", [])
-                    impressions = 0
-                    reach = 0
-                    saved = 0
-                    
-                    for insight in insights:
-                        metric_name = insight.get("name")
-                        value = insight.get("values", [{}])[0].get("value", 0)
-                        
-                        if metric_name == "impressions":
-                            impressions = value
-                        elif metric_name == "reach":
-                            reach = value
-                        elif metric_name == "saved":
-                            saved = value
-                    
-                    engagement = likes + comments + saved
-                    total_engagement += engagement
-                    
-                    # Track by hour
-                    if hour not in engagement_by_hour:
-                        engagement_by_hour[hour] = []
-                    engagement_by_hour[hour].append(engagement)
-                    
-                    # Track by day
-                    if day not in engagement_by_day:
-                        engagement_by_day[day] = []
-                    engagement_by_day[day].append(engagement)
-            
-            # Calculate averages
-            avg_engagement_by_hour = {
-                hour: sum(engagements) / len(engagements) 
-                for hour, engagements in engagement_by_hour.items()
-            }
-            
-            avg_engagement_by_day = {
-                day: sum(engagements) / len(engagements) 
-                for day, engagements in engagement_by_day.items()
-            }
-            
-            # Find peak times (top 3 hours)
-            sorted_hours = sorted(avg_engagement_by_hour.items(), key=lambda x: x[1], reverse=True)
-            peak_hours = [f"{hour}:00-{hour+1}:00" for hour, _ in sorted_hours[:3]]
-            
-            # Find best days (top 3)
-            sorted_days = sorted(avg_engagement_by_day.items(), key=lambda x: x[1], reverse=True)
-            best_days = [day for day, _ in sorted_days[:3]]
-            
-            avg_engagement_rate = (total_engagement / total_posts) if total_posts > 0 else 0
-            
-            return {
-                "peak_times": peak_hours,
-                "best_days": best_days,
-                "avg_engagement_rate": avg_engagement_rate / 1000,  # Normalize
-                "engagement_metrics": {
-                    "avg_likes": total_engagement / total_posts if total_posts > 0 else 0,
-                    "avg_comments": sum(p.get("comments_count", 0) for p in media_data) / total_posts if total_posts > 0 else 0,
-                    "total_posts_analyzed": total_posts
-                },
-                "source": "instagram_graph_api"
-            }
+            return await asyncio.to_thread(self._summarize_engagement, media_data, hashtags, source)
             
         except Exception as e:
             print(f"Instagram API Error: {str(e)}")
             # Return default estimates if API fails
-            return {
-                "peak_times": ["18:00-19:00", "19:00-20:00", "20:00-21:00"],
-                "best_days": ["Friday", "Saturday", "Sunday"],
-                "avg_engagement_rate": 0.045,
-                "engagement_metrics": {
-                    "avg_likes": 150,
-                    "avg_comments": 25,
-                    "error": str(e)
-                },
-                "source": "fallback_estimate"
-            }
+            return self.instagram_fallback(str(e))
+    
+    def _summarize_engagement(self, media_data: List[Dict[str, Any]], hashtags: List[str], source: str) -> Dict[str, Any]:
+        """
+        Aggregate normalized media rows into a 7x24 engagement matrix and read
+        peak hours, best days and peak day/hour slots from it
+        """
+        total_posts = len(media_data)
+        
+        timestamps = np.fromiter((post["timestamp"] for post in media_data), dtype=np.int64, count=total_posts)
+        engagement = np.fromiter(
+            (post["like_count"] + post["comments_count"] + post["saved"] for post in media_data),
+            dtype=np.float64, count=total_posts
+        )
+        comments = np.fromiter((post["comments_count"] for post in media_data), dtype=np.float64, count=total_posts)
+        
+        # Keep posts that match category/hashtags - one automaton for all captions
+        if hashtags:
+            matcher = HashtagMatcher(hashtags)
+            matches = np.fromiter(
+                (matcher.matches(post["caption"]) for post in media_data),
+                dtype=bool, count=total_posts
+            )
+            timestamps, engagement = timestamps[matches], engagement[matches]
+        
+        matrix = EngagementMatrix.from_arrays(timestamps, engagement)
+        total_engagement = matrix.total_engagement
+        
+        peak_hours = [f"{hour}:00-{hour+1}:00" for hour in matrix.peak_hours(3)]
+        best_days = matrix.best_days(3)
+        peak_slots = [f"{day} {hour}:00-{hour+1}:00" for day, hour in matrix.peak_slots(3)]
+        
+        avg_engagement_rate = (total_engagement / total_posts) if total_posts > 0 else 0
+        
+        return {
+            "peak_times": peak_hours,
+            "best_days": best_days,
+            "peak_slots": peak_slots,
+            "avg_engagement_rate": avg_engagement_rate / 1000,  # Normalize
+            "engagement_metrics": {
+                "avg_likes": total_engagement / total_posts if total_posts > 0 else 0,
+                "avg_comments": float(comments.mean()) if total_posts > 0 else 0,
+                "total_posts_analyzed": total_posts
+            },
+            "source": source
+        }
     
     def analyze_with_gemini(self, product_name: str, category: str, keywords: List[str]) -> Dict[str, Any]:
         """
-        Use Gemini AI to analyze seasonal trends, cultural relevance, and regional demand
+        Use Gemini AI to analyze seasonal trends, cultural relevance, and regional demand.
+        Successful analyses are served from the shared TTL/LRU cache.
         """
+        cache_key = gemini_cache_key(product_name, category, keywords)
+        cached = gemini_cache.get(cache_key)
+        if cached is not None:
+            return copy.deepcopy(cached)
+        
         try:
-            prompt = f"""You are a market intelligence expert analyzing product demand in India.
+            prompt = f"""Market intelligence for selling this product on Instagram in India.
 
 Product: {product_name}
 Category: {category}
 Keywords: {', '.join(keywords)}
 
-Analyze the following:
-1. **Seasonal Demand**: Which months/seasons have highest demand? Consider Indian festivals, weather, cultural events.
-2. **Regional Preferences**: Which Indian states would be most interested? Why?
-3. **Festival Connection**: Which festivals boost this product's demand?
-4. **Best Posting Days**: Which days of the week are best for marketing this product?
-5. **Optimal Posting Time**: What time windows (morning/afternoon/evening) work best?
-6. **Target Audience Behavior**: When is the target audience most active on social media?
+Consider Indian festivals, seasons, regional demand and when the target audience is active on social media.
+best_days: weekday names. best_time_slots: ranges like "7:00pm-9:00pm" in {POSTING_TIMEZONE.key} local time. expected_demand_boost: like "+50%". reasoning: at most two sentences."""
 
-Provide your analysis in JSON format:
-{{
-  "season_spike": ["festival_name or month"],
-  "best_months": ["month1", "month2"],
-  "target_states": ["state1", "state2", "state3"],
-  "festivals": ["festival1", "festival2"],
-  "best_days": ["day1", "day2", "day3"],
-  "best_time_slots": ["time_range1", "time_range2"],
-  "reasoning": "detailed explanation",
-  "expected_demand_boost": "percentage or description",
-  "cultural_insights": "key cultural factors"
-}}
-
-Only respond with valid JSON."""
-
-            response = self.gemini_model.generate_content(prompt)
-            response_text = response.text.strip()
-            
-            # Extract JSON from response
-            if "```json" in response_text:
-                response_text = response_text.split("```json")[1].split("```")[0].strip()
-            elif "```" in response_text:
-                response_text = response_text.split("```")[1].split("```")[0].strip()
-            
-            gemini_analysis = json.loads(response_text)
+            # The response schema constrains output to GeminiInsights; it is still
+            # validated so only complete analyses reach compute_best_time and the cache
+            response = self.gemini_model.generate_content(prompt, generation_config=GEMINI_GENERATION_CONFIG)
+            gemini_analysis = parse_gemini_insights(response.text)
+            gemini_cache.set(cache_key, copy.deepcopy(gemini_analysis))
             return gemini_analysis
             
-        except Exception as e:
+        except GEMINI_CALL_ERRORS as e:
             print(f"Gemini API Error: {str(e)}")
             # Return default analysis if Gemini fails
-            return {
-                "season_spike": ["Diwali", "Holi"],
-                "best_months": ["October", "November", "March"],
-                "target_states": ["Maharashtra", "Gujarat", "Rajasthan"],
-                "festivals": ["Diwali", "Ganesh Chaturthi"],
-                "best_days": ["Friday", "Saturday", "Sunday"],
-                "best_time_slots": ["6:00pm-9:00pm", "11:00am-1:00pm"],
-                "reasoning": f"Traditional/artisan products like {category} typically see demand during festival seasons.",
-                "expected_demand_boost": "+50-70%",
-                "cultural_insights": "Cultural products align with festival preparations and gifting seasons",
-                "error": str(e)
-            }
+            return self.gemini_fallback(category, str(e))
     
     def fetch_firestore_history(self, category: str) -> Dict[str, Any]:
         """
-        Fetch historical performance data from Firestore
-        NOTE: You'll need to implement actual Firestore connection
+        Fetch historical performance data for the category from the history
+        store (precomputed per-category hour/day rollups)
         """
         try:
-            # TODO: Implement Firestore connection
-            # from google.cloud import firestore
-            # db = firestore.Client()
-            # query historical posts, views, engagement
-            
-            # For now, return mock data
-            return {
-                "past_performance": {
-                    "avg_views": 250,
-                    "avg_engagement": 45,
-                    "best_performing_times": ["19:00-21:00"],
-                    "best_performing_days": ["Saturday", "Sunday"]
-                },
-                "historical_posts": 0,
-                "source": "mock_data"
-            }
+            return self.history_store.get_history(category)
             
         except Exception as e:
-            print(f"Firestore Error: {str(e)}")
-            return {
-                "past_performance": {},
-                "error": str(e)
-            }
+            print(f"History Error: {str(e)}")
+            return self.history_fallback(str(e))
     
     def compute_best_time(
         self, 
@@ -272,7 +378,7 @@ Only respond with valid JSON."""
         Combine all data sources with weighted algorithm:
         - Instagram engagement: 50%
         - Gemini cultural/seasonal insights: 30%
-        - Firestore historical data: 20%
+        - Historical post performance: 20%
         """
         try:
             # Extract best times from each source
@@ -367,7 +473,7 @@ Only respond with valid JSON."""
         hashtags: Optional[List[str]] = None
     ) -> Dict[str, Any]:
         """
-        Main analysis function - combines all data sources
+        Main analysis function - combines all data sources (blocking)
         """
         if hashtags is None:
             hashtags = keywords
@@ -376,15 +482,188 @@ Only respond with valid JSON."""
         print(f"Analyzing best time to post for: {product_name}")
         
         print("1. Fetching Instagram engagement data...")
-        insta_data = self.fetch_instagram_engagement(category, hashtags)
+        insta_data = run_sync(self.fetch_instagram_engagement(category, hashtags))
         
         print("2. Analyzing with Gemini AI...")
         gemini_data = self.analyze_with_gemini(product_name, category, keywords)
         
-        print("3. Fetching Firestore historical data...")
+        print("3. Fetching historical performance data...")
         firestore_data = self.fetch_firestore_history(category)
         
         print("4. Computing best time recommendation...")
         result = self.compute_best_time(insta_data, gemini_data, firestore_data, product_name, category)
         
         return result
+    
+    async def _run_source(self, name: str, func, args: tuple, timeout: float, fallback) -> Dict[str, Any]:
+        """
+        Run a data source under its own deadline - coroutine functions on the
+        event loop, blocking ones in a worker thread. Falls back to the
+        source's default data when the deadline is missed.
+        """
+        if asyncio.iscoroutinefunction(func):
+            call = func(*args)
+        else:
+            call = asyncio.to_thread(func, *args)
+        try:
+            return await asyncio.wait_for(call, timeout=timeout)
+        except asyncio.TimeoutError:
+            print(f"{name} timed out after {timeout}s, using fallback data")
+            return fallback(f"{name} timed out after {timeout}s")
+    
+    def _source_coroutines(
+        self,
+        product_name: str,
+        category: str,
+        keywords: List[str],
+        hashtags: List[str]
+    ) -> Dict[str, Any]:
+        """
+        One deadline-bounded coroutine per data source, keyed by source name
+        """
+        return {
+            "instagram": self._run_source(
+                "Instagram", self.fetch_instagram_engagement, (category, hashtags),
+                INSTAGRAM_TIMEOUT, self.instagram_fallback
+            ),
+            "gemini": self._run_source(
+                "Gemini", self.analyze_with_gemini, (product_name, category, keywords),
+                GEMINI_TIMEOUT, lambda error: self.gemini_fallback(category, error)
+            ),
+            "history": self._run_source(
+                "History", self.fetch_firestore_history, (category,),
+                HISTORY_TIMEOUT, self.history_fallback
+            ),
+        }
+    
+    async def analyze_async(
+        self, 
+        product_name: str, 
+        category: str, 
+        keywords: List[str],
+        hashtags: Optional[List[str]] = None
+    ) -> Dict[str, Any]:
+        """
+        Concurrent analysis - fetches all data sources at the same time, each with
+        its own deadline, so latency is bounded by the slowest source
+        """
+        if hashtags is None:
+            hashtags = keywords
+        
+        print(f"Analyzing best time to post for: {product_name} (concurrent)")
+        
+        insta_data, gemini_data, firestore_data = await asyncio.gather(
+            *self._source_coroutines(product_name, category, keywords, hashtags).values()
+        )
+        
+        return self.compute_best_time(insta_data, gemini_data, firestore_data, product_name, category)
+    
+    async def analyze_stream_async(
+        self, 
+        product_name: str, 
+        category: str, 
+        keywords: List[str],
+        hashtags: Optional[List[str]] = None
+    ) -> AsyncIterator[Tuple[str, Dict[str, Any]]]:
+        """
+        Streaming analysis - yields ("instagram" | "gemini" | "history", data) as
+        each source finishes, then ("result", final recommendation)
+        """
+        if hashtags is None:
+            hashtags = keywords
+        
+        print(f"Analyzing best time to post for: {product_name} (streaming)")
+        
+        sources = self._source_coroutines(product_name, category, keywords, hashtags)
+        tasks = {asyncio.ensure_future(coroutine): name for name, coroutine in sources.items()}
+        results = {}
+        pending = set(tasks)
+        
+        try:
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    results[tasks[task]] = task.result()
+                    yield tasks[task], results[tasks[task]]
+        finally:
+            # Client went away mid-stream
+            for task in pending:
+                task.cancel()
+        
+        yield "result", self.compute_best_time(
+            results["instagram"], results["gemini"], results["history"], product_name, category
+        )
+    
+    async def analyze_batch_async(
+        self,
+        products: List[Dict[str, Any]],
+        concurrency: int = BATCH_CONCURRENCY
+    ) -> List[Dict[str, Any]]:
+        """
+        Analyze many products in one pass:
+        - account media is fetched once and filtered per product
+        - history is fetched once per category
+        - Gemini runs once per distinct (product, category, keywords), at most
+          `concurrency` calls at a time
+        
+        Args:
+            products: dicts with product_name, category, keywords and optional hashtags
+        
+        Returns:
+            One result per product, in input order
+        """
+        print(f"Analyzing best time to post for {len(products)} products (batch)")
+        
+        # 1. Account-level media, shared by every product
+        try:
+            media = await asyncio.wait_for(self.fetch_instagram_media(), timeout=INSTAGRAM_TIMEOUT)
+            media_error = None
+        except asyncio.TimeoutError:
+            media, media_error = None, f"Instagram timed out after {INSTAGRAM_TIMEOUT}s"
+        except Exception as e:
+            media, media_error = None, str(e)
+        
+        # 2. History, once per category
+        categories = list(dict.fromkeys(product["category"] for product in products))
+        histories = await asyncio.gather(*(
+            self._run_source("History", self.fetch_firestore_history, (category,), HISTORY_TIMEOUT, self.history_fallback)
+            for category in categories
+        ))
+        history_by_category = dict(zip(categories, histories))
+        
+        # 3. Gemini, once per distinct normalized key, under a concurrency cap
+        semaphore = asyncio.Semaphore(concurrency)
+        
+        async def run_gemini(product: Dict[str, Any]) -> Dict[str, Any]:
+            async with semaphore:
+                return await self._run_source(
+                    "Gemini", self.analyze_with_gemini,
+                    (product["product_name"], product["category"], product["keywords"]),
+                    GEMINI_TIMEOUT, lambda error: self.gemini_fallback(product["category"], error)
+                )
+        
+        gemini_tasks = {}
+        for product in products:
+            key = gemini_cache_key(product["product_name"], product["category"], product["keywords"])
+            if key not in gemini_tasks:
+                gemini_tasks[key] = asyncio.ensure_future(run_gemini(product))
+        
+        # 4. Per-product engagement summaries and final scores
+        async def analyze_product(product: Dict[str, Any]) -> Dict[str, Any]:
+            category = product["category"]
+            hashtags = product.get("hashtags")
+            if hashtags is None:
+                hashtags = product["keywords"]
+            if media is None:
+                insta_data = self.instagram_fallback(media_error)
+            else:
+                insta_data = await self.fetch_instagram_engagement(category, hashtags, media)
+            
+            key = gemini_cache_key(product["product_name"], category, product["keywords"])
+            gemini_data = copy.deepcopy(await gemini_tasks[key])
+            
+            return self.compute_best_time(
+                insta_data, gemini_data, history_by_category[category], product["product_name"], category
+            )
+        
+        return list(await asyncio.gather(*(analyze_product(product) for product in products)))
@@ -0,0 +1,160 @@
+import os
+import json
+import time
+import asyncio
+from typing import List, Dict, Any, Optional
+from dotenv import load_dotenv
+from .best_time_analyzer import BATCH_CONCURRENCY, BestTimeAnalyzer, gemini_cache_key
+
+load_dotenv()
+
+PRECOMPUTE_INTERVAL = float(os.getenv("BEST_TIME_PRECOMPUTE_INTERVAL", "600"))
+PRECOMPUTE_STALE_AFTER = float(os.getenv("BEST_TIME_STALE_AFTER", "3600"))
+HOT_KEYS_PATH = os.getenv("BEST_TIME_HOT_KEYS_PATH", os.path.join("data", "hot_keys.json"))
+
+
+class BestTimePrecomputer:
+    """
+    Stale-while-revalidate store of best-time recommendations for registered
+    hot (product, category, keywords, hashtags) keys.
+
+    A background loop recomputes entries once they are older than
+    `stale_after`. Lookups always return the stored result immediately; a
+    stale hit also schedules a refresh so the next caller gets fresh data.
+    Registered keys are persisted to a JSON file and warmed at startup.
+    """
+
+    def __init__(
+        self,
+        analyzer: BestTimeAnalyzer,
+        stale_after: float = PRECOMPUTE_STALE_AFTER,
+        interval: float = PRECOMPUTE_INTERVAL,
+        hot_keys_path: str = HOT_KEYS_PATH
+    ):
+        self.analyzer = analyzer
+        self.stale_after = stale_after
+        self.interval = interval
+        self.hot_keys_path = hot_keys_path
+        self._products: Dict[tuple, Dict[str, Any]] = {}
+        self._results: Dict[tuple, Dict[str, Any]] = {}
+        self._refreshing: Dict[tuple, asyncio.Task] = {}
+        self._loop_task: Optional[asyncio.Task] = None
+        # Refreshes share the batch Gemini concurrency cap
+        self._semaphore = asyncio.Semaphore(BATCH_CONCURRENCY)
+
+    @staticmethod
+    def key(product: Dict[str, Any]) -> tuple:
+        # Same rule as the analyzer: None means "filter by keywords", [] means no filter
+        hashtags = product.get("hashtags")
+        if hashtags is None:
+            hashtags = product["keywords"]
+        return gemini_cache_key(product["product_name"], product["category"], product["keywords"]) + (
+            tuple(sorted({tag.lower() for tag in hashtags})),
+        )
+
+    def _load_hot_keys(self):
+        if not os.path.exists(self.hot_keys_path):
+            return
+        try:
+            with open(self.hot_keys_path, "r", encoding="utf-8") as f:
+                for product in json.load(f):
+                    self._products[self.key(product)] = product
+        except Exception as e:
+            print(f"Hot key load error: {str(e)}")
+
+    def _save_hot_keys(self):
+        hot_keys_dir = os.path.dirname(self.hot_keys_path)
+        if hot_keys_dir:
+            os.makedirs(hot_keys_dir, exist_ok=True)
+        with open(self.hot_keys_path, "w", encoding="utf-8") as f:
+            json.dump(list(self._products.values()), f, indent=2)
+
+    def register(self, product: Dict[str, Any]) -> bool:
+        """
+        Register a hot key and schedule its first computation
+
+        Returns:
+            True if the key was not registered before
+        """
+        key = self.key(product)
+        is_new = key not in self._products
+        self._products[key] = product
+        if is_new:
+            self._save_hot_keys()
+            self.refresh_in_background(key)
+        return is_new
+
+    def registered(self) -> List[Dict[str, Any]]:
+        return list(self._products.values())
+
+    def lookup(self, product: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """
+        Stored recommendation for a registered key, or None when nothing is stored yet.
+        Stale entries are returned as-is and refreshed in the background.
+        """
+        key = self.key(product)
+        entry = self._results.get(key)
+        if entry is None:
+            return None
+
+        age = time.time() - entry["computed_at"]
+        if age >= self.stale_after:
+            self.refresh_in_background(key)
+        return {**entry, "age_seconds": round(age, 1), "stale": age >= self.stale_after}
+
+    async def refresh(self, key: tuple):
+        product = self._products[key]
+        async with self._semaphore:
+            result = await self.analyzer.analyze_async(
+                product_name=product["product_name"],
+                category=product["category"],
+                keywords=product["keywords"],
+                hashtags=product.get("hashtags")
+            )
+        # Keep serving the previous recommendation if this run failed outright
+        if "error" in result and key in self._results:
+            return
+        self._results[key] = {"result": result, "computed_at": time.time()}
+
+    def refresh_in_background(self, key: tuple):
+        """
+        Schedule a refresh unless one is already running for this key
+        """
+        if key in self._refreshing or key not in self._products:
+            return
+
+        task = asyncio.get_running_loop().create_task(self.refresh(key))
+        self._refreshing[key] = task
+
+        def done(finished: asyncio.Task):
+            self._refreshing.pop(key, None)
+            if not finished.cancelled() and finished.exception() is not None:
+                print(f"Precompute error for {key[0]}: {str(finished.exception())}")
+
+        task.add_done_callback(done)
+
+    async def _run(self):
+        while True:
+            now = time.time()
+            for key in list(self._products):
+                entry = self._results.get(key)
+                if entry is None or now - entry["computed_at"] >= self.stale_after:
+                    self.refresh_in_background(key)
+            await asyncio.sleep(self.interval)
+
+    def start(self):
+        """
+        Load persisted hot keys and start the periodic refresh loop
+        """
+        self._load_hot_keys()
+        if self._loop_task is None:
+            self._loop_task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self):
+        tasks = list(self._refreshing.values())
+        if self._loop_task is not None:
+            tasks.append(self._loop_task)
+            self._loop_task = None
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
@@ -0,0 +1,142 @@
+import os
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+from PIL import Image
+from dotenv import load_dotenv
+
+load_dotenv()
+
+CAPTION_CACHE_SIZE = int(os.getenv("CAPTION_CACHE_SIZE", "1024"))
+# Maximum Hamming distance (out of 64 bits) for two images to count as the same shot
+CAPTION_CACHE_MAX_DISTANCE = int(os.getenv("CAPTION_CACHE_MAX_DISTANCE", "6"))
+
+
+def dhash(img: Image.Image, hash_size: int = 8) -> int:
+    """
+    64-bit difference hash: robust to rescaling, recompression and small crops/edits
+    """
+    small = img.convert("L").resize((hash_size + 1, hash_size), Image.Resampling.LANCZOS)
+    pixels = list(small.getdata())
+    value = 0
+    for row in range(hash_size):
+        offset = row * (hash_size + 1)
+        for col in range(hash_size):
+            value = (value << 1) | (pixels[offset + col] > pixels[offset + col + 1])
+    return value
+
+
+def hamming(a: int, b: int) -> int:
+    return bin(a ^ b).count("1")
+
+
+class BKTree:
+    """
+    Burkhard-Keller tree over integer hashes with Hamming distance.
+    Range queries only visit children whose edge distance is within
+    [d - radius, d + radius] of the query's distance to the node.
+    """
+
+    def __init__(self):
+        # node = (hash, {distance: child node})
+        self._root: Optional[Tuple[int, Dict[int, Any]]] = None
+        self.size = 0
+
+    def add(self, value: int):
+        if self._root is None:
+            self._root = (value, {})
+            self.size = 1
+            return
+
+        node = self._root
+        while True:
+            distance = hamming(value, node[0])
+            if distance == 0:
+                return
+            child = node[1].get(distance)
+            if child is None:
+                node[1][distance] = (value, {})
+                self.size += 1
+                return
+            node = child
+
+    def search(self, value: int, radius: int) -> List[Tuple[int, int]]:
+        """
+        All (distance, hash) pairs within `radius` of value
+        """
+        if self._root is None:
+            return []
+
+        found = []
+        stack = [self._root]
+        while stack:
+            node_value, children = stack.pop()
+            distance = hamming(value, node_value)
+            if distance <= radius:
+                found.append((distance, node_value))
+            for edge, child in children.items():
+                if distance - radius <= edge <= distance + radius:
+                    stack.append(child)
+        return found
+
+
+class PerceptualCaptionCache:
+    """
+    Caption cache keyed on perceptual image hashes.
+
+    A lookup returns the captions of the closest cached image within
+    `max_distance` bits. Entries are evicted LRU once `maxsize` is exceeded;
+    evicted hashes are skipped by lookups and dropped from the BK-tree when
+    it is rebuilt.
+    """
+
+    def __init__(self, maxsize: int = CAPTION_CACHE_SIZE, max_distance: int = CAPTION_CACHE_MAX_DISTANCE):
+        self.maxsize = maxsize
+        self.max_distance = max_distance
+        self._entries: "OrderedDict[int, List[str]]" = OrderedDict()
+        self._tree = BKTree()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, image_hash: int) -> Optional[List[str]]:
+        with self._lock:
+            matches = [match for match in self._tree.search(image_hash, self.max_distance) if match[1] in self._entries]
+            if not matches:
+                self.misses += 1
+                return None
+
+            _, nearest = min(matches)
+            self._entries.move_to_end(nearest)
+            self.hits += 1
+            return list(self._entries[nearest])
+
+    def set(self, image_hash: int, captions: List[str]):
+        with self._lock:
+            self._entries[image_hash] = list(captions)
+            self._entries.move_to_end(image_hash)
+            self._tree.add(image_hash)
+
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+            # Drop evicted hashes from the index once they dominate it
+            if self._tree.size > 2 * max(self.maxsize, 1):
+                self._tree = BKTree()
+                for live_hash in self._entries:
+                    self._tree.add(live_hash)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._entries),
+                "maxsize": self.maxsize,
+                "max_distance": self.max_distance,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0
+            }
+
+
+caption_cache = PerceptualCaptionCache()
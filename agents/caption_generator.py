@@ -1,9 +1,15 @@
+import io
 import os
+import re
+from typing import Iterator, List
 from PIL import Image
 from google.adk.agents import Agent
 from google.adk.tools import FunctionTool
 import google.generativeai as genai
 from dotenv import load_dotenv
+from .caption_cache import caption_cache, dhash
+from .image_preprocessor import prepare_for_vision
+from .upload_registry import source_exists
 
 load_dotenv()
 api_key = os.getenv("GOOGLE_API_KEY")
@@ -12,25 +18,7 @@ if not api_key:
 
 genai.configure(api_key=api_key)
 
-def generate_captions(image_path: str) -> dict:
-    """
-    Generates 3 Instagram caption options for the given image file.
-    
-    Args:
-        image_path: Path to the image file
-        
-    Returns:
-        dict with 'captions' key containing list of caption strings
-    """
-    if not image_path or not os.path.exists(image_path):
-        return {"error": "Image file not found", "captions": []}
-
-    try:
-        # Open and prepare image
-        img = Image.open(image_path)
-        
-        # Create the prompt
-        prompt = """You are an Instagram caption specialist.
+CAPTION_PROMPT = """You are an Instagram caption specialist.
 Analyze this image and generate 3 creative Instagram captions with relevant hashtags.
 
 Format each option as:
@@ -45,13 +33,77 @@ OPTION 3: [engaging caption]
 Hashtags: #tag1 #tag2 #tag3
 """
 
+# Start of each "OPTION n" block (tolerates markdown bold around the label)
+OPTION_MARKER = re.compile(r"^[ \t*#]*OPTION\s+\d+", re.MULTILINE | re.IGNORECASE)
+HASHTAGS_LINE = re.compile(r"^[ \t*]*Hashtags\s*:.*$", re.MULTILINE | re.IGNORECASE)
+BLANK_LINE = re.compile(r"\n[ \t]*\n")
+
+
+def caption_block(block: str) -> str:
+    """
+    Trim an OPTION block to its caption and Hashtags line, dropping any text
+    the model added after them (e.g. a closing "Enjoy!")
+    """
+    hashtags = HASHTAGS_LINE.search(block)
+    if hashtags:
+        end = BLANK_LINE.search(block, hashtags.end())
+        if end:
+            block = block[:end.start()]
+    return block.strip()
+
+
+def parse_captions(text: str) -> List[str]:
+    """
+    Up to 3 captions from a model response: one per OPTION block, or the
+    blank-line separated paragraphs when the model ignored the OPTION format.
+    Shared by the blocking and streaming paths, which fill the same cache.
+    """
+    markers = [match.start() for match in OPTION_MARKER.finditer(text)]
+    if markers:
+        blocks = [caption_block(text[start:end]) for start, end in zip(markers, markers[1:] + [len(text)])]
+    else:
+        blocks = text.split("\n\n")
+    return [block.strip() for block in blocks if block.strip()][:3]
+
+
+def load_vision_image(image_path: str) -> Image.Image:
+    """
+    Open a downscaled, EXIF-stripped copy of the image - Gemini doesn't need full resolution
+    """
+    return Image.open(io.BytesIO(prepare_for_vision(image_path)))
+
+
+def generate_captions(image_path: str) -> dict:
+    """
+    Generates 3 Instagram caption options for the given image file.
+    
+    Args:
+        image_path: Path to the image file, or an upload handle ("upload://...")
+        
+    Returns:
+        dict with 'captions' key containing list of caption strings
+    """
+    if not source_exists(image_path):
+        return {"error": "Image file not found", "captions": []}
+
+    try:
+        img = load_vision_image(image_path)
+        
+        # Near-duplicates of an already captioned image skip the model call
+        image_hash = dhash(img)
+        cached_captions = caption_cache.get(image_hash)
+        if cached_captions is not None:
+            return {"captions": cached_captions, "cached": True}
+
         # Use the correct Gemini API for vision
         model = genai.GenerativeModel('gemini-2.0-flash-exp')
-        response = model.generate_content([prompt, img])
+        response = model.generate_content([CAPTION_PROMPT, img])
         
         # Extract and parse captions
-        caption_text = response.text
-        captions = [opt.strip() for opt in caption_text.split("\n\n") if opt.strip()][:3]
+        captions = parse_captions(response.text)
+        
+        if captions:
+            caption_cache.set(image_hash, captions)
         
         return {"captions": captions}
         
@@ -59,6 +111,47 @@ Hashtags: #tag1 #tag2 #tag3
         return {"error": str(e), "captions": []}
 
 
+def stream_captions(img: Image.Image) -> Iterator[str]:
+    """
+    Streams caption options for a prepared vision image.
+
+    Uses Gemini's streaming generation and yields each "OPTION n" block as soon
+    as the next block starts (or the response ends), so the first caption is
+    available well before the full response.
+    """
+    image_hash = dhash(img)
+    cached_captions = caption_cache.get(image_hash)
+    if cached_captions is not None:
+        yield from cached_captions
+        return
+
+    model = genai.GenerativeModel('gemini-2.0-flash-exp')
+    response = model.generate_content([CAPTION_PROMPT, img], stream=True)
+
+    captions = []
+    buffer = ""
+    for chunk in response:
+        buffer += chunk.text
+        markers = [match.start() for match in OPTION_MARKER.finditer(buffer)]
+        # Every block before the last marker is complete
+        for block_start, block_end in zip(markers, markers[1:]):
+            caption = caption_block(buffer[block_start:block_end])
+            if caption and len(captions) < 3:
+                captions.append(caption)
+                yield caption
+        if len(markers) > 1:
+            buffer = buffer[markers[-1]:]
+
+    # Last block, or the whole text when the model ignored the OPTION format
+    for caption in parse_captions(buffer):
+        if caption and len(captions) < 3:
+            captions.append(caption)
+            yield caption
+
+    if captions:
+        caption_cache.set(image_hash, captions)
+
+
 caption_tool = FunctionTool(func=generate_captions)
 
 caption_generator_agent = Agent(
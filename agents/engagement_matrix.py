@@ -0,0 +1,104 @@
+import os
+from datetime import datetime, timezone
+from typing import List, Tuple
+from zoneinfo import ZoneInfo
+import numpy as np
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Timezone every recommended day/time slot is expressed in, and scheduled in
+POSTING_TIMEZONE = ZoneInfo(os.getenv("POSTING_TIMEZONE", "Asia/Kolkata"))
+
+DAY_NAMES = ["Monday", "Tuesday", "Wednesday", "Thursday", "Friday", "Saturday", "Sunday"]
+
+
+def to_local_seconds(timestamps: np.ndarray, tz: ZoneInfo = POSTING_TIMEZONE) -> np.ndarray:
+    """
+    Shift UTC epoch seconds by their UTC offset in `tz`, so that day and hour
+    arithmetic on the result gives local weekdays and hours. Offsets are
+    looked up once per distinct UTC hour (DST aware).
+    """
+    timestamps = np.asarray(timestamps, dtype=np.int64)
+    hours, inverse = np.unique(timestamps // 3600, return_inverse=True)
+    offsets = np.fromiter(
+        (datetime.fromtimestamp(int(hour) * 3600, timezone.utc).astimezone(tz).utcoffset().total_seconds()
+         for hour in hours),
+        dtype=np.int64, count=len(hours)
+    )
+    return timestamps + offsets[inverse.reshape(-1)]
+
+
+class EngagementMatrix:
+    """
+    7x24 (weekday x hour) engagement matrix holding sums, counts and means,
+    bucketed in POSTING_TIMEZONE. Row 0 is Monday, column 0 is 00:00-01:00.
+    """
+
+    def __init__(self, sums: np.ndarray, counts: np.ndarray):
+        self.sums = sums
+        self.counts = counts
+
+    @classmethod
+    def from_arrays(cls, timestamps: np.ndarray, engagement: np.ndarray) -> "EngagementMatrix":
+        """
+        Fill all 168 bins in one vectorized pass
+
+        Args:
+            timestamps: UTC epoch seconds, one per post
+            engagement: engagement value, one per post
+        """
+        timestamps = to_local_seconds(timestamps)
+        engagement = np.asarray(engagement, dtype=np.float64)
+
+        # 1970-01-01 was a Thursday (weekday 3 with Monday = 0)
+        weekday = (timestamps // 86400 + 3) % 7
+        hour = (timestamps // 3600) % 24
+        bins = weekday * 24 + hour
+
+        sums = np.bincount(bins, weights=engagement, minlength=168).reshape(7, 24)
+        counts = np.bincount(bins, minlength=168).reshape(7, 24)
+        return cls(sums, counts)
+
+    @staticmethod
+    def _mean(sums: np.ndarray, counts: np.ndarray) -> np.ndarray:
+        return np.divide(sums, counts, out=np.zeros_like(sums, dtype=np.float64), where=counts > 0)
+
+    @staticmethod
+    def _top(means: np.ndarray, counts: np.ndarray, n: int) -> np.ndarray:
+        # Highest means first, ties keep bin order; empty bins are never returned
+        order = np.argsort(-means, kind="stable")
+        return order[counts[order] > 0][:n]
+
+    @property
+    def total_posts(self) -> int:
+        return int(self.counts.sum())
+
+    @property
+    def total_engagement(self) -> float:
+        return float(self.sums.sum())
+
+    @property
+    def means(self) -> np.ndarray:
+        return self._mean(self.sums, self.counts)
+
+    def peak_hours(self, n: int = 3) -> List[int]:
+        """
+        Hours of the day with the highest average engagement
+        """
+        sums, counts = self.sums.sum(axis=0), self.counts.sum(axis=0)
+        return [int(hour) for hour in self._top(self._mean(sums, counts), counts, n)]
+
+    def best_days(self, n: int = 3) -> List[str]:
+        """
+        Weekdays with the highest average engagement
+        """
+        sums, counts = self.sums.sum(axis=1), self.counts.sum(axis=1)
+        return [DAY_NAMES[day] for day in self._top(self._mean(sums, counts), counts, n)]
+
+    def peak_slots(self, n: int = 3) -> List[Tuple[str, int]]:
+        """
+        Joint (weekday, hour) bins with the highest average engagement
+        """
+        top = self._top(self.means.ravel(), self.counts.ravel(), n)
+        return [(DAY_NAMES[index // 24], int(index % 24)) for index in top]
@@ -0,0 +1,76 @@
+from collections import deque
+from typing import Dict, Iterable, List
+
+
+class HashtagMatcher:
+    """
+    Case-insensitive multi-pattern substring matcher (Aho-Corasick automaton).
+
+    Built once from the hashtag/keyword list and reused for every caption, so
+    each caption is scanned in a single pass regardless of how many tags
+    there are. Matching semantics are the same as
+    `any(tag.lower() in caption.lower() for tag in tags)`.
+    """
+
+    def __init__(self, patterns: Iterable[str]):
+        patterns = {pattern.lower() for pattern in patterns}
+        # An empty tag is a substring of every caption
+        self.match_all = "" in patterns
+        self.patterns = sorted(pattern for pattern in patterns if pattern)
+
+        self._delta: List[Dict[str, int]] = [{}]
+        self._accept: List[bool] = [False]
+        self._build()
+
+    def _build(self):
+        # Trie of all patterns
+        for pattern in self.patterns:
+            state = 0
+            for ch in pattern:
+                next_state = self._delta[state].get(ch)
+                if next_state is None:
+                    next_state = len(self._delta)
+                    self._delta.append({})
+                    self._accept.append(False)
+                    self._delta[state][ch] = next_state
+                state = next_state
+            self._accept[state] = True
+
+        # Breadth-first pass: resolve failure links into a full transition table
+        # so matching never has to walk failure chains
+        alphabet = {ch for pattern in self.patterns for ch in pattern}
+        fail = [0] * len(self._delta)
+        queue = deque()
+        for ch, state in self._delta[0].items():
+            queue.append(state)
+
+        while queue:
+            state = queue.popleft()
+            self._accept[state] = self._accept[state] or self._accept[fail[state]]
+            for ch in alphabet:
+                next_state = self._delta[state].get(ch)
+                if next_state is not None:
+                    fail[next_state] = self._delta[fail[state]].get(ch, 0)
+                    queue.append(next_state)
+                else:
+                    fallback = self._delta[fail[state]].get(ch, 0)
+                    if fallback:
+                        self._delta[state][ch] = fallback
+
+    def __bool__(self) -> bool:
+        return self.match_all or bool(self.patterns)
+
+    def matches(self, text: str) -> bool:
+        """
+        True when any pattern occurs in the text
+        """
+        if self.match_all:
+            return True
+
+        delta, accept = self._delta, self._accept
+        state = 0
+        for ch in text.lower():
+            state = delta[state].get(ch, 0)
+            if accept[state]:
+                return True
+        return False
@@ -0,0 +1,210 @@
+import os
+from abc import ABC, abstractmethod
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional
+from dotenv import load_dotenv
+from .engagement_matrix import DAY_NAMES, POSTING_TIMEZONE
+from .sqlite_store import SQLiteStore, process_wide
+
+load_dotenv()
+
+DEFAULT_HISTORY_DB_PATH = os.getenv("HISTORY_DB_PATH", os.path.join("data", "history.db"))
+
+def normalize_category(category: str) -> str:
+    return " ".join(category.lower().split())
+
+
+class HistoryStore(ABC):
+    """
+    Interface for engagement-history backends.
+
+    Implementations keep per-category hour/day rollups up to date as posts
+    are recorded, so get_history never scans raw posts.
+    """
+
+    @abstractmethod
+    def record_post(self, post_id: str, category: str, posted_at: int, views: int = 0, engagement: int = 0):
+        """
+        Record (or re-record) a published post
+
+        Args:
+            post_id: Instagram media id
+            category: Product category the post belongs to
+            posted_at: Publish time as UTC epoch seconds
+            views: Impressions so far
+            engagement: Likes + comments + saves so far
+        """
+        ...
+
+    @abstractmethod
+    def refresh_metrics(self, posts: List[Dict[str, Any]]) -> int:
+        """
+        Update views/engagement of already-recorded posts from normalized media rows.
+        Posts that were never recorded are ignored.
+
+        Returns:
+            Number of recorded posts whose metrics changed
+        """
+        ...
+
+    @abstractmethod
+    def get_history(self, category: str) -> Dict[str, Any]:
+        """
+        Historical performance for a category, in the shape compute_best_time reads
+        """
+        ...
+
+
+class SQLiteHistoryStore(SQLiteStore, HistoryStore):
+    """
+    Embedded SQLite history backend.
+
+    `rollups` holds one row per (category, kind, bucket) where kind is
+    'hour' (bucket 0-23), 'day' (bucket 0-6, Monday = 0) or 'total'
+    (bucket 0), with hours and days in POSTING_TIMEZONE. Rows are adjusted by
+    deltas whenever a post is recorded or its metrics change, and a lookup is
+    one primary-key range read.
+    """
+
+    def __init__(self, db_path: Optional[str] = None):
+        super().__init__(db_path or DEFAULT_HISTORY_DB_PATH)
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS posts (
+                post_id TEXT PRIMARY KEY,
+                category TEXT NOT NULL,
+                posted_at INTEGER NOT NULL,
+                views INTEGER NOT NULL DEFAULT 0,
+                engagement INTEGER NOT NULL DEFAULT 0
+            )
+        """)
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS rollups (
+                category TEXT NOT NULL,
+                kind TEXT NOT NULL,
+                bucket INTEGER NOT NULL,
+                posts INTEGER NOT NULL DEFAULT 0,
+                views INTEGER NOT NULL DEFAULT 0,
+                engagement INTEGER NOT NULL DEFAULT 0,
+                PRIMARY KEY (category, kind, bucket)
+            ) WITHOUT ROWID
+        """)
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS settings (
+                key TEXT PRIMARY KEY,
+                value TEXT NOT NULL
+            )
+        """)
+        self._sync_rollup_timezone()
+        self._conn.commit()
+
+    def _sync_rollup_timezone(self):
+        """
+        Rebuild the rollups from the raw posts when they were bucketed in
+        another timezone (stores created before the setting existed used UTC)
+        """
+        row = self._conn.execute("SELECT value FROM settings WHERE key = 'rollup_timezone'").fetchone()
+        if row is not None and row[0] == POSTING_TIMEZONE.key:
+            return
+
+        self._conn.execute("DELETE FROM rollups")
+        for category, posted_at, views, engagement in self._conn.execute(
+            "SELECT category, posted_at, views, engagement FROM posts"
+        ).fetchall():
+            self._apply(category, posted_at, 1, views, engagement)
+        self._conn.execute(
+            "INSERT OR REPLACE INTO settings (key, value) VALUES ('rollup_timezone', ?)", (POSTING_TIMEZONE.key,)
+        )
+
+    @staticmethod
+    def _buckets(posted_at: int) -> List[tuple]:
+        timestamp = datetime.fromtimestamp(posted_at, tz=POSTING_TIMEZONE)
+        return [("hour", timestamp.hour), ("day", timestamp.weekday()), ("total", 0)]
+
+    def _apply(self, category: str, posted_at: int, posts: int, views: int, engagement: int):
+        self._conn.executemany("""
+            INSERT INTO rollups (category, kind, bucket, posts, views, engagement)
+            VALUES (?, ?, ?, ?, ?, ?)
+            ON CONFLICT(category, kind, bucket) DO UPDATE SET
+                posts = posts + excluded.posts,
+                views = views + excluded.views,
+                engagement = engagement + excluded.engagement
+        """, [(category, kind, bucket, posts, views, engagement) for kind, bucket in self._buckets(posted_at)])
+
+    def record_post(self, post_id: str, category: str, posted_at: int, views: int = 0, engagement: int = 0):
+        category = normalize_category(category)
+        with self._lock:
+            existing = self._conn.execute(
+                "SELECT category, posted_at, views, engagement FROM posts WHERE post_id = ?", (post_id,)
+            ).fetchone()
+            if existing is not None:
+                # Take the old contribution out before adding the new one
+                self._apply(existing[0], existing[1], -1, -existing[2], -existing[3])
+
+            self._conn.execute("""
+                INSERT INTO posts (post_id, category, posted_at, views, engagement)
+                VALUES (?, ?, ?, ?, ?)
+                ON CONFLICT(post_id) DO UPDATE SET
+                    category = excluded.category,
+                    posted_at = excluded.posted_at,
+                    views = excluded.views,
+                    engagement = excluded.engagement
+            """, (post_id, category, posted_at, views, engagement))
+            self._apply(category, posted_at, 1, views, engagement)
+            self._conn.commit()
+
+    def refresh_metrics(self, posts: List[Dict[str, Any]]) -> int:
+        changed = 0
+        with self._lock:
+            for post in posts:
+                existing = self._conn.execute(
+                    "SELECT category, posted_at, views, engagement FROM posts WHERE post_id = ?", (post["id"],)
+                ).fetchone()
+                if existing is None:
+                    continue
+
+                category, posted_at, old_views, old_engagement = existing
+                views = post["impressions"]
+                engagement = post["like_count"] + post["comments_count"] + post["saved"]
+                if views == old_views and engagement == old_engagement:
+                    continue
+
+                self._conn.execute(
+                    "UPDATE posts SET views = ?, engagement = ? WHERE post_id = ?",
+                    (views, engagement, post["id"])
+                )
+                self._apply(category, posted_at, 0, views - old_views, engagement - old_engagement)
+                changed += 1
+            self._conn.commit()
+        return changed
+
+    def get_history(self, category: str) -> Dict[str, Any]:
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT kind, bucket, posts, views, engagement FROM rollups WHERE category = ?",
+                (normalize_category(category),)
+            ).fetchall()
+
+        total_posts, total_views, total_engagement = 0, 0, 0
+        hours, days = [], []
+        for kind, bucket, posts, views, engagement in rows:
+            if kind == "total":
+                total_posts, total_views, total_engagement = posts, views, engagement
+            elif posts > 0:
+                (hours if kind == "hour" else days).append((bucket, engagement / posts))
+
+        hours.sort(key=lambda x: x[1], reverse=True)
+        days.sort(key=lambda x: x[1], reverse=True)
+
+        return {
+            "past_performance": {
+                "avg_views": total_views / total_posts if total_posts > 0 else 0,
+                "avg_engagement": total_engagement / total_posts if total_posts > 0 else 0,
+                "best_performing_times": [f"{hour}:00-{hour+1}:00" for hour, _ in hours[:2]],
+                "best_performing_days": [DAY_NAMES[day] for day, _ in days[:2]]
+            },
+            "historical_posts": total_posts,
+            "source": "local_history"
+        }
+
+
+get_history_store: Callable[[], HistoryStore] = process_wide(SQLiteHistoryStore)
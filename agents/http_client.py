@@ -0,0 +1,63 @@
+import os
+import asyncio
+import threading
+import weakref
+import httpx
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Graph API base URL (one version for every Instagram call)
+GRAPH_API_URL = "https://graph.facebook.com/v21.0"
+
+HTTP_MAX_CONNECTIONS = int(os.getenv("HTTP_MAX_CONNECTIONS", "100"))
+HTTP_MAX_KEEPALIVE_CONNECTIONS = int(os.getenv("HTTP_MAX_KEEPALIVE_CONNECTIONS", "20"))
+HTTP_KEEPALIVE_EXPIRY = float(os.getenv("HTTP_KEEPALIVE_EXPIRY", "30"))
+HTTP_CONNECT_TIMEOUT = float(os.getenv("HTTP_CONNECT_TIMEOUT", "5"))
+HTTP_TIMEOUT = float(os.getenv("HTTP_TIMEOUT", "30"))
+# Image uploads get a longer read/write budget than Graph API calls
+UPLOAD_TIMEOUT = float(os.getenv("HTTP_UPLOAD_TIMEOUT", "120"))
+
+
+def create_http_client() -> httpx.AsyncClient:
+    """
+    Create an async HTTP client with a keep-alive connection pool and default timeouts
+    """
+    return httpx.AsyncClient(
+        limits=httpx.Limits(
+            max_connections=HTTP_MAX_CONNECTIONS,
+            max_keepalive_connections=HTTP_MAX_KEEPALIVE_CONNECTIONS,
+            keepalive_expiry=HTTP_KEEPALIVE_EXPIRY
+        ),
+        timeout=httpx.Timeout(HTTP_TIMEOUT, connect=HTTP_CONNECT_TIMEOUT)
+    )
+
+
+# One client per event loop: connections can't be shared across loops, and
+# scripts may run the analyzer on their own loop next to the server's
+_clients: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, httpx.AsyncClient]" = weakref.WeakKeyDictionary()
+_clients_lock = threading.Lock()
+
+
+def get_http_client() -> httpx.AsyncClient:
+    """
+    Shared client for the running event loop, created on first use.
+    All Graph API and Cloudinary traffic goes through it.
+    """
+    loop = asyncio.get_running_loop()
+    with _clients_lock:
+        client = _clients.get(loop)
+        if client is None or client.is_closed:
+            client = create_http_client()
+            _clients[loop] = client
+        return client
+
+
+async def close_http_client():
+    """
+    Close the running loop's shared client (app shutdown)
+    """
+    with _clients_lock:
+        client = _clients.pop(asyncio.get_running_loop(), None)
+    if client is not None:
+        await client.aclose()
@@ -0,0 +1,125 @@
+import io
+import os
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Optional
+from PIL import Image, ImageOps
+from dotenv import load_dotenv
+from .upload_registry import open_source
+
+load_dotenv()
+
+# Gemini vision only needs a small image; Instagram displays at most 1080px wide
+VISION_MAX_SIDE = int(os.getenv("VISION_MAX_SIDE", "768"))
+VISION_FORMAT = os.getenv("VISION_FORMAT", "WEBP")
+VISION_QUALITY = int(os.getenv("VISION_QUALITY", "80"))
+INSTAGRAM_MAX_SIDE = int(os.getenv("INSTAGRAM_MAX_SIDE", "1080"))
+INSTAGRAM_QUALITY = int(os.getenv("INSTAGRAM_QUALITY", "88"))
+PREPROCESS_WORKERS = int(os.getenv("IMAGE_PREPROCESS_WORKERS", str(min(4, os.cpu_count() or 1))))
+
+
+def preprocess_image_bytes(data: bytes, max_side: int, fmt: str, quality: int) -> bytes:
+    """
+    Apply EXIF orientation, downscale so the longest side is at most
+    `max_side`, and re-encode. EXIF and other metadata are not carried over.
+    Runs inside the worker processes.
+    """
+    with Image.open(io.BytesIO(data)) as img:
+        img = ImageOps.exif_transpose(img)
+        if img.mode not in ("RGB", "L"):
+            img = img.convert("RGB")
+        img.thumbnail((max_side, max_side), Image.Resampling.LANCZOS)
+
+        output = io.BytesIO()
+        img.save(output, format=fmt, quality=quality, optimize=True)
+        return output.getvalue()
+
+
+_pool: Optional[ProcessPoolExecutor] = None
+_pool_lock = threading.Lock()
+
+
+def start_pool() -> ProcessPoolExecutor:
+    """
+    Create the shared process pool. The app does this in its lifespan; other
+    callers get it on first use.
+
+    Workers come from a forkserver (spawn where that is unavailable), never
+    from a fork of this process, which already runs gRPC and HTTP threads.
+    """
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            start_method = "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+            _pool = ProcessPoolExecutor(
+                max_workers=PREPROCESS_WORKERS,
+                mp_context=multiprocessing.get_context(start_method)
+            )
+        return _pool
+
+
+def _get_pool() -> ProcessPoolExecutor:
+    return _pool or start_pool()
+
+
+def _replace_broken_pool(broken: ProcessPoolExecutor):
+    """
+    Drop a pool whose worker died (OOM, decoder crash) so the next call
+    starts a fresh one; a pool already replaced by another thread is kept
+    """
+    global _pool
+    with _pool_lock:
+        if _pool is broken:
+            _pool = None
+    broken.shutdown(wait=False, cancel_futures=True)
+
+
+def shutdown_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown(wait=False, cancel_futures=True)
+            _pool = None
+
+
+def preprocess_image(data: bytes, max_side: int, fmt: str, quality: int) -> bytes:
+    """
+    Preprocess image bytes in the shared process pool (blocks the calling
+    thread). A broken pool is replaced and the image retried once.
+    """
+    pool = _get_pool()
+    try:
+        return pool.submit(preprocess_image_bytes, data, max_side, fmt, quality).result()
+    except BrokenProcessPool:
+        print("Image preprocessing pool broke, starting a new one")
+        _replace_broken_pool(pool)
+    return _get_pool().submit(preprocess_image_bytes, data, max_side, fmt, quality).result()
+
+
+def read_source(image_path: str) -> bytes:
+    with open_source(image_path) as image_file:
+        return image_file.read()
+
+
+def prepare_for_vision(image_path: str) -> bytes:
+    """
+    Small re-encoded copy of the image for Gemini vision calls
+    """
+    return preprocess_image(read_source(image_path), VISION_MAX_SIDE, VISION_FORMAT, VISION_QUALITY)
+
+
+# Identifies the Instagram encoding settings, for caches keyed on original bytes
+INSTAGRAM_TARGET = f"jpeg:{INSTAGRAM_MAX_SIDE}:{INSTAGRAM_QUALITY}"
+
+
+def prepare_bytes_for_instagram(data: bytes) -> bytes:
+    return preprocess_image(data, INSTAGRAM_MAX_SIDE, "JPEG", INSTAGRAM_QUALITY)
+
+
+def prepare_for_instagram(image_path: str) -> bytes:
+    """
+    1080px JPEG copy of the image for the Cloudinary/Instagram upload
+    """
+    return prepare_bytes_for_instagram(read_source(image_path))
@@ -0,0 +1,262 @@
+import os
+import asyncio
+import time
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional
+import httpx
+from dotenv import load_dotenv
+from .history_store import HistoryStore, get_history_store
+from .http_client import GRAPH_API_URL, get_http_client
+from .sqlite_store import SQLiteStore, process_wide
+
+load_dotenv()
+
+MEDIA_FIELDS = "id,caption,like_count,comments_count,timestamp,media_type,insights.metric(impressions,reach,saved)"
+
+DEFAULT_DB_PATH = os.getenv("ENGAGEMENT_DB_PATH", os.path.join("data", "engagement.db"))
+INGEST_INTERVAL = float(os.getenv("INSTAGRAM_INGEST_INTERVAL", "900"))
+INGEST_PAGE_SIZE = int(os.getenv("INSTAGRAM_INGEST_PAGE_SIZE", "100"))
+# Posts younger than this keep collecting likes/comments, so they are re-read on every pass
+INGEST_REFRESH_WINDOW = float(os.getenv("INSTAGRAM_INGEST_REFRESH_DAYS", "7")) * 86400
+
+
+def normalize_media(post: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Flatten a Graph API media object into the row shape used by the engagement store.
+    The timestamp is converted to UTC epoch seconds.
+    """
+    timestamp = datetime.fromisoformat(post.get("timestamp", "").replace("Z", "+00:00"))
+
+    metrics = {"impressions": 0, "reach": 0, "saved": 0}
+    for insight in post.get("insights", {}).get("data", []):
+        metric_name = insight.get("name")
+        if metric_name in metrics:
+            metrics[metric_name] = insight.get("values", [{}])[0].get("value", 0)
+
+    return {
+        "id": post.get("id"),
+        "caption": post.get("caption", "") or "",
+        "timestamp": int(timestamp.timestamp()),
+        "media_type": post.get("media_type", ""),
+        "like_count": post.get("like_count", 0),
+        "comments_count": post.get("comments_count", 0),
+        "impressions": metrics["impressions"],
+        "reach": metrics["reach"],
+        "saved": metrics["saved"],
+    }
+
+
+class EngagementStore(SQLiteStore):
+    """
+    Local SQLite store of Instagram media and their engagement metrics
+    """
+
+    COLUMNS = [
+        "id", "caption", "timestamp", "media_type",
+        "like_count", "comments_count", "impressions", "reach", "saved"
+    ]
+
+    def __init__(self, db_path: Optional[str] = None):
+        super().__init__(db_path or DEFAULT_DB_PATH)
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS media (
+                id TEXT PRIMARY KEY,
+                caption TEXT NOT NULL DEFAULT '',
+                timestamp INTEGER NOT NULL,
+                media_type TEXT NOT NULL DEFAULT '',
+                like_count INTEGER NOT NULL DEFAULT 0,
+                comments_count INTEGER NOT NULL DEFAULT 0,
+                impressions INTEGER NOT NULL DEFAULT 0,
+                reach INTEGER NOT NULL DEFAULT 0,
+                saved INTEGER NOT NULL DEFAULT 0,
+                updated_at INTEGER NOT NULL
+            )
+        """)
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_media_timestamp ON media (timestamp)")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS ingest_state (
+                key TEXT PRIMARY KEY,
+                value TEXT NOT NULL
+            )
+        """)
+        self._conn.commit()
+
+    def upsert_media(self, posts: List[Dict[str, Any]]) -> int:
+        """
+        Insert new media and update media whose metrics changed.
+        Unchanged rows are left untouched.
+
+        Returns:
+            Number of rows inserted or updated
+        """
+        if not posts:
+            return 0
+
+        now = int(time.time())
+        rows = [tuple(post[column] for column in self.COLUMNS) + (now,) for post in posts]
+
+        with self._lock:
+            before = self._conn.total_changes
+            self._conn.executemany("""
+                INSERT INTO media (
+                    id, caption, timestamp, media_type,
+                    like_count, comments_count, impressions, reach, saved, updated_at
+                ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                ON CONFLICT(id) DO UPDATE SET
+                    caption = excluded.caption,
+                    like_count = excluded.like_count,
+                    comments_count = excluded.comments_count,
+                    impressions = excluded.impressions,
+                    reach = excluded.reach,
+                    saved = excluded.saved,
+                    updated_at = excluded.updated_at
+                WHERE media.caption != excluded.caption
+                   OR media.like_count != excluded.like_count
+                   OR media.comments_count != excluded.comments_count
+                   OR media.impressions != excluded.impressions
+                   OR media.reach != excluded.reach
+                   OR media.saved != excluded.saved
+            """, rows)
+            self._conn.commit()
+            return self._conn.total_changes - before
+
+    def load_media(self) -> List[Dict[str, Any]]:
+        """
+        Read every stored media row
+        """
+        with self._lock:
+            cursor = self._conn.execute(f"SELECT {', '.join(self.COLUMNS)} FROM media")
+            return [dict(zip(self.COLUMNS, row)) for row in cursor.fetchall()]
+
+    def count(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM media").fetchone()[0]
+
+    def latest_timestamp(self) -> Optional[int]:
+        with self._lock:
+            return self._conn.execute("SELECT MAX(timestamp) FROM media").fetchone()[0]
+
+    def get_state(self, key: str) -> Optional[str]:
+        with self._lock:
+            row = self._conn.execute("SELECT value FROM ingest_state WHERE key = ?", (key,)).fetchone()
+            return row[0] if row else None
+
+    def set_state(self, key: str, value: str):
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO ingest_state (key, value) VALUES (?, ?) "
+                "ON CONFLICT(key) DO UPDATE SET value = excluded.value",
+                (key, value)
+            )
+            self._conn.commit()
+
+
+get_engagement_store: Callable[[], EngagementStore] = process_wide(EngagementStore)
+
+
+class InstagramIngester:
+    """
+    Background task that pages through the account's media via the
+    Graph API cursors and upserts new/changed media into the engagement store.
+    Metrics of posts recorded in the history store are refreshed on the way.
+
+    Until one pass has reached the end of the account's media, every pass
+    backfills the whole history. After that, passes stop paging once a page
+    is entirely older than the refresh window.
+    """
+
+    def __init__(
+        self,
+        store: EngagementStore,
+        interval: float = INGEST_INTERVAL,
+        page_size: int = INGEST_PAGE_SIZE,
+        refresh_window: float = INGEST_REFRESH_WINDOW,
+        http_client: Optional[httpx.AsyncClient] = None,
+        history_store: Optional[HistoryStore] = None
+    ):
+        self.store = store
+        self.history_store = history_store or get_history_store()
+        # None means the shared pooled client of the running event loop
+        self.http_client = http_client
+        self.interval = interval
+        self.page_size = page_size
+        self.refresh_window = refresh_window
+        self.instagram_access_token = os.getenv("INSTAGRAM_ACCESS_TOKEN")
+        self.instagram_business_account_id = os.getenv("INSTAGRAM_BUSINESS_ACCOUNT_ID")
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.instagram_access_token and self.instagram_business_account_id)
+
+    async def ingest_once(self) -> Dict[str, int]:
+        """
+        Run a single incremental ingestion pass. SQLite writes run in worker
+        threads so the event loop only waits on the network.
+
+        Returns:
+            dict with pages fetched, media seen and rows upserted
+        """
+        cutoff = None
+        if await asyncio.to_thread(self.store.get_state, "backfill_complete") == "1":
+            latest = await asyncio.to_thread(self.store.latest_timestamp)
+            if latest is not None:
+                cutoff = latest - self.refresh_window
+
+        url = f"{GRAPH_API_URL}/{self.instagram_business_account_id}/media"
+        params = {
+            "fields": MEDIA_FIELDS,
+            "access_token": self.instagram_access_token,
+            "limit": self.page_size
+        }
+        stats = {"pages": 0, "seen": 0, "upserted": 0}
+        client = self.http_client or get_http_client()
+
+        while url:
+            response = await client.get(url, params=params)
+            if response.status_code != 200:
+                raise Exception(f"Instagram API error: {response.text}")
+
+            payload = response.json()
+            posts = [normalize_media(post) for post in payload.get("data", [])]
+            stats["pages"] += 1
+            stats["seen"] += len(posts)
+            stats["upserted"] += await asyncio.to_thread(self.store.upsert_media, posts)
+            # Keep rollups of posts we published in sync with their latest metrics
+            await asyncio.to_thread(self.history_store.refresh_metrics, posts)
+
+            if cutoff is not None and all(post["timestamp"] < cutoff for post in posts):
+                break
+
+            # The "next" URL already carries the cursor and the original query
+            url = payload.get("paging", {}).get("next")
+            params = None
+
+            if not url:
+                await asyncio.to_thread(self.store.set_state, "backfill_complete", "1")
+
+        return stats
+
+    async def _run(self):
+        while True:
+            try:
+                stats = await self.ingest_once()
+                print(f"Instagram ingestion: {stats['upserted']} new/changed of {stats['seen']} media ({stats['pages']} pages)")
+            except Exception as e:
+                print(f"Instagram ingestion error: {str(e)}")
+            await asyncio.sleep(self.interval)
+
+    def start(self):
+        """
+        Start periodic ingestion as a task on the running event loop.
+        No-op without Instagram credentials.
+        """
+        if not self.enabled or self._task is not None:
+            return
+        self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
@@ -1,95 +1,387 @@
 import os
-import requests
+import time
+import random
+import asyncio
+from typing import Awaitable, Callable, List, Optional, Tuple
 import cloudinary
-import cloudinary.uploader
+import cloudinary.utils
 from dotenv import load_dotenv
 from google.adk.agents import Agent
 from google.adk.tools import FunctionTool
+from .history_store import get_history_store
+from .http_client import GRAPH_API_URL, UPLOAD_TIMEOUT, get_http_client
+from .image_preprocessor import INSTAGRAM_TARGET, prepare_bytes_for_instagram, read_source
+from .rate_governor import PUBLISH_ENDPOINT, RateLimitExceeded, rate_governor
+from .upload_cache import get_upload_cache, upload_cache_key
+from .upload_registry import source_exists
 
 load_dotenv()
 
+# Container readiness polling (seconds)
+CONTAINER_POLL_INITIAL_DELAY = float(os.getenv("INSTAGRAM_CONTAINER_POLL_DELAY", "1"))
+CONTAINER_POLL_MAX_DELAY = float(os.getenv("INSTAGRAM_CONTAINER_POLL_MAX_DELAY", "8"))
+CONTAINER_POLL_TIMEOUT = float(os.getenv("INSTAGRAM_CONTAINER_POLL_TIMEOUT", "60"))
+# Instagram's limit on images per carousel post
+MAX_CAROUSEL_ITEMS = 10
+
+# Graph errors meaning Instagram could not fetch the image_url (e.g. the
+# Cloudinary asset is gone); only these are worth a fresh upload
+MEDIA_FETCH_ERROR_CODES = {9004}
+MEDIA_FETCH_ERROR_SUBCODES = {2207003, 2207020, 2207052}
+
 cloudinary.config(
     cloud_name=os.getenv("CLOUD_NAME"),
     api_key=os.getenv("API_KEY"),
     api_secret=os.getenv("API_SECRET")
 )
 
-def instagram_post_run(image_path: str, caption: str = "") -> dict:
+async def upload_to_cloudinary(image_bytes: bytes) -> dict:
     """
-    Uploads image to Cloudinary, then posts the image to Instagram via the Graph API.
+    Signed upload to the Cloudinary Upload API through the shared HTTP client
+    
+    Returns:
+        Cloudinary upload response (secure_url, public_id, ...)
+    """
+    params = cloudinary.utils.sign_request({"timestamp": int(time.time())}, {})
+    response = await get_http_client().post(
+        cloudinary.utils.cloudinary_api_url("upload", resource_type="image"),
+        data=params,
+        files={"file": ("image.jpg", image_bytes, "image/jpeg")},
+        timeout=UPLOAD_TIMEOUT
+    )
+    upload_result = response.json()
+    if "error" in upload_result:
+        raise Exception(f"Cloudinary error: {upload_result['error'].get('message')}")
+    return upload_result
+
+
+async def wait_for_container(container_id: str, business_account_id: str, access_token: str) -> str:
+    """
+    Poll a media container's status_code until it is ready to publish, with
+    exponential backoff and jitter between polls
+    
+    Returns:
+        Final status code (FINISHED)
+    """
+    delay = CONTAINER_POLL_INITIAL_DELAY
+    deadline = time.monotonic() + CONTAINER_POLL_TIMEOUT
+    while True:
+        await rate_governor.acquire(business_account_id, "container_status")
+        response = await get_http_client().get(
+            f"{GRAPH_API_URL}/{container_id}",
+            params={"fields": "status_code", "access_token": access_token}
+        )
+        rate_governor.observe(business_account_id, "container_status", response)
+        status_code = response.json().get("status_code")
+
+        if status_code in ("FINISHED", "PUBLISHED"):
+            return status_code
+        if status_code in ("ERROR", "EXPIRED"):
+            raise Exception(f"Container {container_id} status: {status_code}")
+
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            raise TimeoutError(f"Container {container_id} not ready after {CONTAINER_POLL_TIMEOUT}s")
+        # Equal jitter: half the delay fixed, half random
+        await asyncio.sleep(min(delay / 2 + random.uniform(0, delay / 2), remaining))
+        delay = min(delay * 2, CONTAINER_POLL_MAX_DELAY)
+
+
+class GraphAPIError(Exception):
+    """
+    A Graph API call returned an error instead of an id
+    """
+
+    def __init__(self, message: str, error: Optional[dict] = None):
+        super().__init__(message)
+        error = error or {}
+        self.code = error.get("code")
+        self.subcode = error.get("error_subcode")
+
+    @property
+    def media_fetch_failed(self) -> bool:
+        return self.code in MEDIA_FETCH_ERROR_CODES or self.subcode in MEDIA_FETCH_ERROR_SUBCODES
+
+
+async def upload_image(image_path: str, fresh: bool = False) -> Tuple[str, bool]:
+    """
+    Upload an image (1080px JPEG, orientation applied, EXIF stripped) to
+    Cloudinary. Identical bytes (retries, reposts) reuse the earlier upload
+    unless `fresh` is set.
+    
+    Returns:
+        (Cloudinary secure_url, reused)
+    """
+    original_bytes = await asyncio.to_thread(read_source, image_path)
+    cache_key = await asyncio.to_thread(upload_cache_key, original_bytes, INSTAGRAM_TARGET)
+    if fresh:
+        await asyncio.to_thread(get_upload_cache().delete, cache_key)
+
+    async def upload() -> dict:
+        print("Uploading image to Cloudinary...")
+        image_bytes = await asyncio.to_thread(prepare_bytes_for_instagram, original_bytes)
+        return await upload_to_cloudinary(image_bytes)
+
+    image_url, reused = await get_upload_cache().get_or_upload(cache_key, upload)
+
+    print("Reusing Cloudinary upload." if reused else "Cloudinary upload successful.")
+    print("Image URL:", image_url)
+    return image_url, reused
+
+
+async def create_container(business_account_id: str, access_token: str, params: dict) -> str:
+    """
+    Create a media container (image, carousel item or carousel)
+    
+    Returns:
+        container id
+    """
+    await rate_governor.acquire(business_account_id, "media")
+    upload_response = await get_http_client().post(
+        f"{GRAPH_API_URL}/{business_account_id}/media",
+        data={**params, "access_token": access_token}
+    )
+    rate_governor.observe(business_account_id, "media", upload_response)
+    upload_data = upload_response.json()
+    print("Upload response:", upload_data)
+
+    if "id" not in upload_data:
+        error = upload_data.get("error", {})
+        raise GraphAPIError(f"Upload failed: {error.get('message', str(upload_data))}", error)
+    return upload_data["id"]
+
+
+async def create_image_container(
+    business_account_id: str,
+    access_token: str,
+    image_path: str,
+    image_url: str,
+    reused: bool,
+    params: dict
+) -> Tuple[str, str]:
+    """
+    Create the container for an uploaded image. When Instagram cannot fetch
+    a reused upload (e.g. the Cloudinary asset was deleted or has expired),
+    the cached URL is dropped and the image is uploaded again, once. Other
+    errors (caption, token, permissions) are raised as they are.
+    
+    Returns:
+        (container id, image_url actually used)
+    """
+    try:
+        return await create_container(business_account_id, access_token, {**params, "image_url": image_url}), image_url
+    except GraphAPIError as e:
+        if not reused or not e.media_fetch_failed:
+            raise
+        print(f"Cached upload rejected ({str(e)}), uploading again...")
+
+    image_url, _ = await upload_image(image_path, fresh=True)
+    return await create_container(business_account_id, access_token, {**params, "image_url": image_url}), image_url
+
+
+async def publish_container(business_account_id: str, access_token: str, container_id: str) -> str:
+    """
+    Publish a finished container
+    
+    Returns:
+        Instagram media id
+    """
+    await rate_governor.acquire(business_account_id, PUBLISH_ENDPOINT)
+    publish_response = await get_http_client().post(
+        f"{GRAPH_API_URL}/{business_account_id}/media_publish",
+        data={
+            "creation_id": container_id,
+            "access_token": access_token
+        },
+    )
+    rate_governor.observe(business_account_id, PUBLISH_ENDPOINT, publish_response)
+    publish_data = publish_response.json()
+    print("Publish response:", publish_data)
+
+    if "id" not in publish_data:
+        error = publish_data.get("error", {})
+        raise GraphAPIError(f"Publish failed: {error.get('message', str(publish_data))}", error)
+    return publish_data["id"]
+
+
+async def record_history(media_id: str, category: str):
+    if not category:
+        return
+    try:
+        await asyncio.to_thread(get_history_store().record_post, media_id, category, int(time.time()))
+    except Exception as e:
+        print(f"History record error: {str(e)}")
+
+
+OnStage = Optional[Callable[[str], Awaitable[None]]]
+
+
+async def run_publish(
+    publish: Callable[[str, str, Callable[[str], Awaitable[None]]], Awaitable[dict]],
+    category: str = "",
+    on_stage: OnStage = None
+) -> dict:
+    """
+    Shared wrapper of the posting pipelines: checks credentials and the
+    account's publishing quota, runs `publish(business_account_id,
+    access_token, stage)`, records the new post in the engagement history
+    and turns failures into a result dict.
     
     Args:
-        image_path: Path to the image file to upload
-        caption: Caption text for the Instagram post
-        
+        publish: Returns the success result (with media_id); awaits
+                 stage(name) as each step starts
+        on_stage: Awaited with "uploading", "creating_container",
+                  "processing_container" and "publishing" (job progress reporting)
+    
     Returns:
-        dict with post_status, media_id, and image_url
+        publish's result, or a dict with post_status; retry_after (seconds)
+        when the request was rejected by the rate governor
     """
+    async def stage(name: str):
+        if on_stage is not None:
+            await on_stage(name)
+
     access_token = os.getenv("INSTAGRAM_ACCESS_TOKEN")
     business_account_id = os.getenv("INSTAGRAM_BUSINESS_ACCOUNT_ID")
 
     if not access_token or not business_account_id:
         return {"post_status": "Missing Instagram API credentials."}
 
-    if not image_path or not os.path.exists(image_path):
-        return {"post_status": f"Image file not found: {image_path}"}
-
     try:
-        print("Uploading image to Cloudinary...")
-        upload_result = cloudinary.uploader.upload(image_path)
-        image_url = upload_result.get("secure_url")
+        # Reject before any upload work when the account is out of publishing quota
+        await rate_governor.sync_publish_quota(business_account_id, access_token)
+        rate_governor.check(business_account_id, PUBLISH_ENDPOINT)
+
+        result = await publish(business_account_id, access_token, stage)
+        await record_history(result["media_id"], category)
+        return result
+
+    except GraphAPIError as e:
+        return {"post_status": str(e)}
+
+    except RateLimitExceeded as e:
+        print(f"Rate limited: {str(e)}")
+        return {"post_status": f"Rate limited: {str(e)}", "retry_after": round(e.retry_after, 1)}
+
+    except Exception as e:
+        print(f"Exception occurred: {str(e)}")
+        return {"post_status": f"Exception: {str(e)}"}
 
-        if not image_url:
-            return {"post_status": "Cloudinary upload failed."}
 
-        print("Cloudinary upload successful.")
-        print("Image URL:", image_url)
+async def publish_image(image_path: str, caption: str = "", category: str = "", on_stage: OnStage = None) -> dict:
+    """
+    Upload -> container -> publish pipeline behind instagram_post_run
+    
+    Returns:
+        dict with post_status, media_id, and image_url (see run_publish for failures)
+    """
+    if not source_exists(image_path):
+        return {"post_status": f"Image file not found: {image_path}"}
+
+    async def publish(business_account_id: str, access_token: str, stage) -> dict:
+        await stage("uploading")
+        image_url, reused = await upload_image(image_path)
 
         # Step 1: Upload image to Instagram container
+        await stage("creating_container")
         print("Sending image to Instagram via Graph API...")
-        upload_url = f"https://graph.facebook.com/v21.0/{business_account_id}/media"
-        payload = {
-            "image_url": image_url,
+        container_id, image_url = await create_image_container(
+            business_account_id, access_token, image_path, image_url, reused, {"caption": caption}
+        )
+
+        await stage("processing_container")
+        await wait_for_container(container_id, business_account_id, access_token)
+
+        # Step 2: Publish container
+        await stage("publishing")
+        print("Publishing post to Instagram...")
+        media_id = await publish_container(business_account_id, access_token, container_id)
+
+        return {
+            "post_status": "Successfully posted to Instagram!",
+            "media_id": media_id,
             "caption": caption,
-            "access_token": access_token
+            "image_url": image_url,
         }
-        upload_response = requests.post(upload_url, data=payload)
-        upload_data = upload_response.json()
-        print("Upload response:", upload_data)
 
-        if "id" not in upload_data:
-            error_msg = upload_data.get("error", {}).get("message", str(upload_data))
-            return {"post_status": f"Upload failed: {error_msg}"}
+    return await run_publish(publish, category, on_stage)
 
-        container_id = upload_data["id"]
 
-        # Step 2: Publish container
-        print("Publishing post to Instagram...")
-        publish_url = f"https://graph.facebook.com/v21.0/{business_account_id}/media_publish"
-        publish_response = requests.post(
-            publish_url,
-            data={
-                "creation_id": container_id,
-                "access_token": access_token
-            },
+async def publish_carousel(
+    image_paths: List[str],
+    caption: str = "",
+    category: str = "",
+    on_stage: OnStage = None
+) -> dict:
+    """
+    Post 2-10 images as one carousel. Cloudinary uploads, child containers
+    and their readiness polls all run concurrently, so the whole post takes
+    about as long as a single image.
+    
+    Returns:
+        dict with post_status, media_id, and image_urls (see run_publish for failures)
+    """
+    if not 2 <= len(image_paths) <= MAX_CAROUSEL_ITEMS:
+        return {"post_status": f"A carousel needs 2 to {MAX_CAROUSEL_ITEMS} images, got {len(image_paths)}"}
+
+    missing = [image_path for image_path in image_paths if not source_exists(image_path)]
+    if missing:
+        return {"post_status": f"Image file not found: {', '.join(missing)}"}
+
+    async def publish(business_account_id: str, access_token: str, stage) -> dict:
+        await stage("uploading")
+        uploads = await asyncio.gather(*(upload_image(image_path) for image_path in image_paths))
+
+        # Step 1: One carousel item container per image, then the carousel container
+        await stage("creating_container")
+        print(f"Creating {len(uploads)} carousel item containers...")
+        children = await asyncio.gather(*(
+            create_image_container(
+                business_account_id, access_token, image_path, image_url, reused, {"is_carousel_item": "true"}
+            )
+            for image_path, (image_url, reused) in zip(image_paths, uploads)
+        ))
+        child_ids = [child_id for child_id, _ in children]
+        image_urls = [image_url for _, image_url in children]
+
+        await stage("processing_container")
+        await asyncio.gather(*(
+            wait_for_container(child_id, business_account_id, access_token) for child_id in child_ids
+        ))
+        container_id = await create_container(
+            business_account_id, access_token,
+            {"media_type": "CAROUSEL", "children": ",".join(child_ids), "caption": caption}
         )
-        publish_data = publish_response.json()
-        print("Publish response:", publish_data)
+        await wait_for_container(container_id, business_account_id, access_token)
 
-        if "id" not in publish_data:
-            error_msg = publish_data.get("error", {}).get("message", str(publish_data))
-            return {"post_status": f"Publish failed: {error_msg}"}
+        # Step 2: Publish carousel
+        await stage("publishing")
+        print("Publishing carousel to Instagram...")
+        media_id = await publish_container(business_account_id, access_token, container_id)
 
         return {
-            "post_status": "Successfully posted to Instagram!",
-            "media_id": publish_data["id"],
+            "post_status": "Successfully posted carousel to Instagram!",
+            "media_id": media_id,
             "caption": caption,
-            "image_url": image_url,
+            "image_urls": image_urls,
         }
 
-    except Exception as e:
-        print(f"Exception occurred: {str(e)}")
-        return {"post_status": f"Exception: {str(e)}"}
+    return await run_publish(publish, category, on_stage)
+
+
+async def instagram_post_run(image_path: str, caption: str = "", category: str = "") -> dict:
+    """
+    Uploads image to Cloudinary, then posts the image to Instagram via the Graph API.
+    
+    Args:
+        image_path: Path to the image file to upload, or an upload handle ("upload://...")
+        caption: Caption text for the Instagram post
+        category: Optional product category, recorded in the engagement history
+        
+    Returns:
+        dict with post_status, media_id, and image_url
+    """
+    return await publish_image(image_path, caption, category)
 
 
 insta_tool = FunctionTool(func=instagram_post_run)
@@ -99,7 +391,7 @@ instagram_poster_agent = Agent(
     model="gemini-2.0-flash-exp",
     instruction="""
 You are an Instagram Poster Agent.
-When given an image path and caption, use the instagram_post_run tool to:
+When given an image path, caption and optional category, use the instagram_post_run tool to:
 1. Upload the image to Cloudinary
 2. Post it to Instagram via the Graph API
 3. Return the post status, media ID, and image URL
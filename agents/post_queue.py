@@ -0,0 +1,234 @@
+import io
+import os
+import json
+import time
+import asyncio
+from typing import Any, Dict, List, Optional, Tuple
+from dotenv import load_dotenv
+from .instagram_poster import publish_image
+from .sqlite_store import SQLiteStore
+from .upload_registry import upload_registry
+
+load_dotenv()
+
+DEFAULT_DB_PATH = os.getenv("POST_QUEUE_DB_PATH", os.path.join("data", "post_jobs.db"))
+POST_QUEUE_WORKERS = int(os.getenv("POST_QUEUE_WORKERS", "2"))
+
+
+class PostJobStore(SQLiteStore):
+    """
+    Local SQLite store of posting jobs. The image bytes are kept with the job
+    until it succeeds, so queued work survives a restart.
+    """
+
+    TABLE = "post_jobs"
+    COLUMNS = ["id", "status", "stage", "filename", "caption", "category", "result", "error", "created_at", "updated_at"]
+
+    def __init__(self, db_path: Optional[str] = None):
+        super().__init__(db_path or DEFAULT_DB_PATH)
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS post_jobs (
+                id TEXT PRIMARY KEY,
+                status TEXT NOT NULL,
+                stage TEXT NOT NULL,
+                filename TEXT NOT NULL DEFAULT '',
+                caption TEXT NOT NULL DEFAULT '',
+                category TEXT NOT NULL DEFAULT '',
+                image BLOB,
+                result TEXT,
+                error TEXT,
+                created_at INTEGER NOT NULL,
+                updated_at INTEGER NOT NULL
+            )
+        """)
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_post_jobs_status ON post_jobs (status, created_at)")
+        # Stores created before idempotency keys existed lack the column
+        columns = {row[1] for row in self._conn.execute("PRAGMA table_info(post_jobs)")}
+        if "idempotency_key" not in columns:
+            self._conn.execute("ALTER TABLE post_jobs ADD COLUMN idempotency_key TEXT")
+        self._conn.execute(
+            "CREATE UNIQUE INDEX IF NOT EXISTS idx_post_jobs_idempotency_key ON post_jobs (idempotency_key)"
+        )
+        self._conn.commit()
+
+    def create(
+        self,
+        image: bytes,
+        filename: str,
+        caption: str,
+        category: str,
+        idempotency_key: Optional[str] = None
+    ) -> Tuple[str, bool]:
+        """
+        Returns:
+            (job id, created). With an idempotency key that already has a job,
+            that job's id and False.
+        """
+        job_id = os.urandom(8).hex()
+        now = int(time.time())
+        with self._lock:
+            cursor = self._conn.execute(
+                "INSERT INTO post_jobs (id, status, stage, filename, caption, category, image, idempotency_key, "
+                "created_at, updated_at) VALUES (?, 'queued', 'queued', ?, ?, ?, ?, ?, ?, ?) "
+                "ON CONFLICT(idempotency_key) DO NOTHING",
+                (job_id, filename, caption, category, image, idempotency_key, now, now)
+            )
+            self._conn.commit()
+            if cursor.rowcount > 0:
+                return job_id, True
+            row = self._conn.execute(
+                "SELECT id FROM post_jobs WHERE idempotency_key = ?", (idempotency_key,)
+            ).fetchone()
+        return row[0], False
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """
+        Job status without the image bytes
+        """
+        with self._lock:
+            row = self._conn.execute(
+                f"SELECT {', '.join(self.COLUMNS)} FROM post_jobs WHERE id = ?", (job_id,)
+            ).fetchone()
+        if row is None:
+            return None
+        job = dict(zip(self.COLUMNS, row))
+        job["result"] = json.loads(job["result"]) if job["result"] else None
+        return job
+
+    def load_image(self, job_id: str) -> Optional[bytes]:
+        with self._lock:
+            row = self._conn.execute("SELECT image FROM post_jobs WHERE id = ?", (job_id,)).fetchone()
+            return row[0] if row else None
+
+    def update(self, job_id: str, **fields):
+        if "result" in fields:
+            fields["result"] = json.dumps(fields["result"])
+        super().update(job_id, **fields)
+
+    def unfinished(self) -> List[Dict[str, Any]]:
+        """
+        Queued and running jobs (id, status, stage), oldest first
+        """
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT id, status, stage FROM post_jobs WHERE status IN ('queued', 'running') ORDER BY created_at"
+            ).fetchall()
+        return [{"id": row[0], "status": row[1], "stage": row[2]} for row in rows]
+
+
+class PostQueue:
+    """
+    Runs posting jobs on a bounded pool of asyncio workers.
+
+    Job status moves queued -> running -> succeeded | failed; while running,
+    `stage` follows publish_image (uploading, creating_container,
+    processing_container, publishing). Jobs rejected by the rate governor go
+    back to queued and are retried once their retry_after has passed.
+    Unfinished jobs are picked up again on start. A job that was cut off
+    while publishing is marked failed instead, since Instagram may already
+    have published it and a retry could post it twice.
+    """
+
+    def __init__(self, store: Optional[PostJobStore] = None, workers: int = POST_QUEUE_WORKERS):
+        self.store = store or PostJobStore()
+        self.workers = workers
+        self._queue: "asyncio.Queue[str]" = asyncio.Queue()
+        self._tasks: List[asyncio.Task] = []
+
+    async def submit(
+        self,
+        image: bytes,
+        filename: str,
+        caption: str = "",
+        category: str = "",
+        idempotency_key: Optional[str] = None
+    ) -> str:
+        """
+        Persist a posting job and queue it. Submitting again with the same
+        idempotency key returns the existing job instead of posting twice.
+
+        Returns:
+            job id
+        """
+        job_id, created = await asyncio.to_thread(
+            self.store.create, image, filename, caption, category, idempotency_key
+        )
+        # An existing job is already queued, finished, or requeued by _recover
+        if created:
+            self._queue.put_nowait(job_id)
+        return job_id
+
+    async def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        return await asyncio.to_thread(self.store.get, job_id)
+
+    async def _run_job(self, job_id: str):
+        job = await asyncio.to_thread(self.store.get, job_id)
+        image = await asyncio.to_thread(self.store.load_image, job_id)
+        if job is None or image is None:
+            return
+
+        async def on_stage(stage: str):
+            await asyncio.to_thread(self.store.update, job_id, stage=stage)
+
+        await asyncio.to_thread(self.store.update, job_id, status="running", stage="starting")
+        upload_handle = upload_registry.register(io.BytesIO(image), job["filename"])
+        try:
+            result = await publish_image(upload_handle, job["caption"], job["category"], on_stage=on_stage)
+        except Exception as e:
+            result = {"post_status": f"Exception: {str(e)}"}
+        finally:
+            upload_registry.release(upload_handle)
+
+        if "retry_after" in result:
+            # Over the rate limit before anything was posted - run it again once tokens are back
+            await asyncio.to_thread(
+                self.store.update, job_id, status="queued", stage="rate_limited", result=result
+            )
+            asyncio.get_running_loop().call_later(result["retry_after"], self._queue.put_nowait, job_id)
+        elif "media_id" in result:
+            # The image is no longer needed once the post is live
+            await asyncio.to_thread(
+                self.store.update, job_id, status="succeeded", stage="done", result=result, image=None
+            )
+        else:
+            await asyncio.to_thread(
+                self.store.update, job_id, status="failed", result=result, error=result["post_status"]
+            )
+
+    async def _work(self):
+        while True:
+            job_id = await self._queue.get()
+            try:
+                await self._run_job(job_id)
+            except Exception as e:
+                print(f"Post job {job_id} error: {str(e)}")
+            finally:
+                self._queue.task_done()
+
+    async def _recover(self):
+        for job in await asyncio.to_thread(self.store.unfinished):
+            if job["status"] == "running" and job["stage"] == "publishing":
+                await asyncio.to_thread(
+                    self.store.update, job["id"], status="failed",
+                    error="Interrupted while publishing; check the account before posting again"
+                )
+                continue
+            await asyncio.to_thread(self.store.update, job["id"], status="queued", stage="queued")
+            self._queue.put_nowait(job["id"])
+
+    async def start(self):
+        """
+        Requeue unfinished jobs and start the workers
+        """
+        if self._tasks:
+            return
+        await self._recover()
+        loop = asyncio.get_running_loop()
+        self._tasks = [loop.create_task(self._work()) for _ in range(self.workers)]
+
+    async def stop(self):
+        # Jobs cut off here stay unfinished in the store and are recovered on the next start
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
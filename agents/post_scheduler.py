@@ -0,0 +1,297 @@
+import os
+import re
+import time
+import heapq
+import asyncio
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional, Tuple
+from dotenv import load_dotenv
+from .engagement_matrix import DAY_NAMES, POSTING_TIMEZONE
+from .post_queue import PostQueue
+from .sqlite_store import SQLiteStore
+
+load_dotenv()
+
+DEFAULT_DB_PATH = os.getenv("SCHEDULER_DB_PATH", os.path.join("data", "scheduled_posts.db"))
+# A recommended slot must be at least this far away to be picked (seconds)
+MIN_SCHEDULE_LEAD = float(os.getenv("SCHEDULER_MIN_LEAD", "60"))
+# Upper bound on the dispatcher's sleep, so wall-clock jumps are picked up
+MAX_DISPATCH_SLEEP = 60.0
+# A post whose dispatch hit a store error is tried again after this long (seconds)
+DISPATCH_RETRY_DELAY = 30.0
+
+DAY_ALTERNATION = "|".join(DAY_NAMES)
+DAY_PATTERN = re.compile(rf"({DAY_ALTERNATION})(?:\s*-\s*({DAY_ALTERNATION}))?", re.IGNORECASE)
+TIME_PATTERN = re.compile(r"(\d{1,2})(?::(\d{2}))?\s*(am|pm)?", re.IGNORECASE)
+
+
+def parse_best_time(best_time_to_post: str) -> Tuple[List[int], int, int]:
+    """
+    Read the weekdays and start time out of a best_time_to_post string such
+    as "Friday, Saturday | 7:00pm-9:00pm" or "Friday-Sunday | 18:00-19:00"
+
+    Returns:
+        (weekday numbers, hour, minute). All weekdays when none are named;
+        19:00 when no time is found.
+    """
+    days_part, _, time_part = best_time_to_post.partition("|")
+
+    weekdays = []
+    for match in DAY_PATTERN.finditer(days_part):
+        first = DAY_NAMES.index(match.group(1).capitalize())
+        last = DAY_NAMES.index(match.group(2).capitalize()) if match.group(2) else first
+        # Ranges may wrap around the week ("Saturday-Monday")
+        for offset in range((last - first) % 7 + 1):
+            weekday = (first + offset) % 7
+            if weekday not in weekdays:
+                weekdays.append(weekday)
+
+    hour, minute = 19, 0
+    # Slots can carry their own day range ("Friday-Sunday 7:00pm-10:00pm")
+    time_match = TIME_PATTERN.search(DAY_PATTERN.sub("", time_part or days_part))
+    if time_match:
+        hour, minute = int(time_match.group(1)) % 24, int(time_match.group(2) or 0) % 60
+        meridiem = (time_match.group(3) or "").lower()
+        if meridiem == "pm" and hour < 12:
+            hour += 12
+        elif meridiem == "am" and hour == 12:
+            hour = 0
+
+    return weekdays or list(range(7)), hour, minute
+
+
+def next_posting_slot(best_time_to_post: str, now: Optional[datetime] = None) -> datetime:
+    """
+    Next moment matching a best_time_to_post recommendation, in POSTING_TIMEZONE
+    """
+    weekdays, hour, minute = parse_best_time(best_time_to_post)
+    now = (now or datetime.now(POSTING_TIMEZONE)).astimezone(POSTING_TIMEZONE)
+    earliest = now + timedelta(seconds=MIN_SCHEDULE_LEAD)
+
+    for days_ahead in range(8):
+        day = now.date() + timedelta(days=days_ahead)
+        slot = datetime(day.year, day.month, day.day, hour, minute, tzinfo=POSTING_TIMEZONE)
+        if slot.weekday() in weekdays and slot >= earliest:
+            return slot
+    raise ValueError(f"No posting slot found for: {best_time_to_post}")
+
+
+class ScheduledPostStore(SQLiteStore):
+    """
+    Local SQLite store of scheduled posts. The image bytes stay with the row
+    until it is handed to the posting queue.
+    """
+
+    TABLE = "scheduled_posts"
+    COLUMNS = [
+        "id", "status", "publish_at", "filename", "caption", "category",
+        "best_time_to_post", "job_id", "error", "created_at", "updated_at"
+    ]
+
+    def __init__(self, db_path: Optional[str] = None):
+        super().__init__(db_path or DEFAULT_DB_PATH)
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS scheduled_posts (
+                id TEXT PRIMARY KEY,
+                status TEXT NOT NULL,
+                publish_at INTEGER NOT NULL,
+                filename TEXT NOT NULL DEFAULT '',
+                caption TEXT NOT NULL DEFAULT '',
+                category TEXT NOT NULL DEFAULT '',
+                best_time_to_post TEXT NOT NULL DEFAULT '',
+                image BLOB,
+                job_id TEXT,
+                error TEXT,
+                created_at INTEGER NOT NULL,
+                updated_at INTEGER NOT NULL
+            )
+        """)
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS idx_scheduled_posts_due ON scheduled_posts (status, publish_at)"
+        )
+        self._conn.commit()
+
+    def create(
+        self,
+        image: bytes,
+        filename: str,
+        caption: str,
+        category: str,
+        publish_at: int,
+        best_time_to_post: str = ""
+    ) -> str:
+        schedule_id = os.urandom(8).hex()
+        now = int(time.time())
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO scheduled_posts (id, status, publish_at, filename, caption, category, "
+                "best_time_to_post, image, created_at, updated_at) VALUES (?, 'scheduled', ?, ?, ?, ?, ?, ?, ?, ?)",
+                (schedule_id, publish_at, filename, caption, category, best_time_to_post, image, now, now)
+            )
+            self._conn.commit()
+        return schedule_id
+
+    def get(self, schedule_id: str) -> Optional[Dict[str, Any]]:
+        """
+        Scheduled post without the image bytes
+        """
+        with self._lock:
+            row = self._conn.execute(
+                f"SELECT {', '.join(self.COLUMNS)} FROM scheduled_posts WHERE id = ?", (schedule_id,)
+            ).fetchone()
+        return dict(zip(self.COLUMNS, row)) if row else None
+
+    def load_image(self, schedule_id: str) -> Optional[bytes]:
+        with self._lock:
+            row = self._conn.execute("SELECT image FROM scheduled_posts WHERE id = ?", (schedule_id,)).fetchone()
+            return row[0] if row else None
+
+    def cancel(self, schedule_id: str) -> bool:
+        """
+        Cancel a post that has not been dispatched yet
+
+        Returns:
+            True if the post was still scheduled
+        """
+        with self._lock:
+            cursor = self._conn.execute(
+                "UPDATE scheduled_posts SET status = 'cancelled', image = NULL, updated_at = ? "
+                "WHERE id = ? AND status = 'scheduled'",
+                (int(time.time()), schedule_id)
+            )
+            self._conn.commit()
+            return cursor.rowcount > 0
+
+    def claim(self, schedule_id: str) -> bool:
+        """
+        Mark a scheduled post as being dispatched, before its job is created
+
+        Returns:
+            True if the post was scheduled, or left mid-dispatch by a crash
+        """
+        with self._lock:
+            cursor = self._conn.execute(
+                "UPDATE scheduled_posts SET status = 'dispatching', updated_at = ? "
+                "WHERE id = ? AND status IN ('scheduled', 'dispatching')",
+                (int(time.time()), schedule_id)
+            )
+            self._conn.commit()
+            return cursor.rowcount > 0
+
+    def pending(self) -> List[Tuple[int, str]]:
+        """
+        (publish_at, id) of every post still waiting to be dispatched,
+        including ones a crash interrupted mid-dispatch
+        """
+        with self._lock:
+            return self._conn.execute(
+                "SELECT publish_at, id FROM scheduled_posts WHERE status IN ('scheduled', 'dispatching')"
+            ).fetchall()
+
+
+class PostScheduler:
+    """
+    Dispatches scheduled posts to the posting queue at their publish time.
+
+    Pending posts live in SQLite and, as (publish_at, id) pairs, in an
+    in-memory min-heap rebuilt on start, so scheduling and dispatching are
+    O(log n). The dispatcher sleeps until the earliest publish time or until
+    an earlier post is scheduled. Cancelled posts are skipped when they reach
+    the top of the heap. Posts that came due while the app was down are
+    dispatched right after start.
+    """
+
+    def __init__(self, post_queue: PostQueue, store: Optional[ScheduledPostStore] = None):
+        self.post_queue = post_queue
+        self.store = store or ScheduledPostStore()
+        self._heap: List[Tuple[int, str]] = []
+        self._wakeup = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+
+    async def schedule(
+        self,
+        image: bytes,
+        filename: str,
+        caption: str,
+        category: str,
+        publish_at: datetime,
+        best_time_to_post: str = ""
+    ) -> str:
+        """
+        Persist a post for `publish_at` and queue it for dispatch
+
+        Returns:
+            schedule id
+        """
+        timestamp = int(publish_at.timestamp())
+        schedule_id = await asyncio.to_thread(
+            self.store.create, image, filename, caption, category, timestamp, best_time_to_post
+        )
+        heapq.heappush(self._heap, (timestamp, schedule_id))
+        self._wakeup.set()
+        return schedule_id
+
+    async def get(self, schedule_id: str) -> Optional[Dict[str, Any]]:
+        return await asyncio.to_thread(self.store.get, schedule_id)
+
+    async def cancel(self, schedule_id: str) -> bool:
+        return await asyncio.to_thread(self.store.cancel, schedule_id)
+
+    async def _dispatch(self, schedule_id: str):
+        # The claim is recorded before the job exists; if the process dies in
+        # between, the schedule id (the job's idempotency key) maps the retry
+        # back to the job already created instead of posting twice
+        try:
+            if not await asyncio.to_thread(self.store.claim, schedule_id):
+                return
+            post = await asyncio.to_thread(self.store.get, schedule_id)
+            image = await asyncio.to_thread(self.store.load_image, schedule_id)
+            job_id = await self.post_queue.submit(
+                image, post["filename"], post["caption"], post["category"], idempotency_key=schedule_id
+            )
+        except Exception as e:
+            print(f"Scheduled post {schedule_id} dispatch error: {str(e)}")
+            await asyncio.to_thread(self.store.update, schedule_id, status="failed", error=str(e))
+            return
+
+        # The posting job holds its own copy of the image
+        await asyncio.to_thread(self.store.update, schedule_id, status="dispatched", job_id=job_id, image=None)
+
+    async def _run(self):
+        while True:
+            self._wakeup.clear()
+            while self._heap and self._heap[0][0] <= time.time():
+                _, schedule_id = heapq.heappop(self._heap)
+                try:
+                    await self._dispatch(schedule_id)
+                except Exception as e:
+                    # Store errors (e.g. a locked database) must not stop the dispatcher
+                    print(f"Scheduled post {schedule_id} dispatch error: {str(e)}; retrying in {DISPATCH_RETRY_DELAY:.0f}s")
+                    heapq.heappush(self._heap, (int(time.time() + DISPATCH_RETRY_DELAY), schedule_id))
+
+            timeout = MAX_DISPATCH_SLEEP
+            if self._heap:
+                timeout = min(timeout, max(0.0, self._heap[0][0] - time.time()))
+            # asyncio.wait rather than wait_for: a cancel that races the
+            # wakeup must not be swallowed
+            wakeup = asyncio.ensure_future(self._wakeup.wait())
+            try:
+                await asyncio.wait({wakeup}, timeout=timeout)
+            finally:
+                wakeup.cancel()
+
+    async def start(self):
+        """
+        Rebuild the heap from the store and start the dispatcher
+        """
+        if self._task is not None:
+            return
+        self._heap = await asyncio.to_thread(self.store.pending)
+        heapq.heapify(self._heap)
+        self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
@@ -0,0 +1,219 @@
+import os
+import json
+import time
+import asyncio
+import threading
+from typing import Dict, Optional, Tuple
+import httpx
+from dotenv import load_dotenv
+from .http_client import GRAPH_API_URL, get_http_client
+
+load_dotenv()
+
+# Default Graph API budget per (account, endpoint) until usage headers say otherwise
+GRAPH_CALLS_PER_HOUR = float(os.getenv("GRAPH_CALLS_PER_HOUR", "200"))
+# Instagram allows this many API-published posts per account in a rolling 24 hours
+PUBLISH_LIMIT_PER_DAY = float(os.getenv("INSTAGRAM_PUBLISH_LIMIT_PER_DAY", "100"))
+# Callers wait at most this long for a token before RateLimitExceeded
+RATE_LIMIT_MAX_WAIT = float(os.getenv("GRAPH_RATE_LIMIT_MAX_WAIT", "10"))
+# How often content_publishing_limit is re-read per account
+PUBLISH_QUOTA_REFRESH = float(os.getenv("INSTAGRAM_PUBLISH_QUOTA_REFRESH", "300"))
+
+PUBLISH_ENDPOINT = "media_publish"
+
+# Graph error codes for application, user, page and custom-level throttling
+THROTTLE_ERROR_CODES = {4, 17, 32, 613, 80002}
+
+
+class RateLimitExceeded(Exception):
+    """
+    No token is available within the caller's wait budget
+    """
+
+    def __init__(self, account: str, endpoint: str, retry_after: float):
+        super().__init__(f"Rate limit for {endpoint} on {account} exceeded; retry after {retry_after:.0f}s")
+        self.account = account
+        self.endpoint = endpoint
+        self.retry_after = retry_after
+
+
+class TokenBucket:
+    """
+    Holds up to `capacity` tokens, refilled continuously at capacity / period per second
+    """
+
+    def __init__(self, capacity: float, period: float):
+        self.capacity = capacity
+        self.rate = capacity / period
+        self.tokens = capacity
+        self.blocked_until = 0.0
+        self._updated = time.monotonic()
+
+    def _refill(self, now: float):
+        self.tokens = min(self.capacity, self.tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def wait_time(self, now: float) -> float:
+        """
+        Seconds until a token can be taken
+        """
+        self._refill(now)
+        wait = max(0.0, self.blocked_until - now)
+        if self.tokens < 1:
+            wait = max(wait, (1 - self.tokens) / self.rate)
+        return wait
+
+    def take(self):
+        self.tokens -= 1
+
+    def limit_to(self, available: float):
+        """
+        Cap the current tokens, e.g. to what the API reports as left
+        """
+        self._refill(time.monotonic())
+        self.tokens = min(self.tokens, max(0.0, available))
+
+    def block_for(self, seconds: float):
+        self.blocked_until = max(self.blocked_until, time.monotonic() + seconds)
+
+
+def usage_percent(headers: httpx.Headers, account: str) -> Tuple[float, float]:
+    """
+    Highest usage percentage and regain-access delay (seconds) reported by the
+    X-App-Usage and X-Business-Use-Case-Usage headers
+    """
+    percent, regain_seconds = 0.0, 0.0
+    try:
+        app_usage = json.loads(headers.get("x-app-usage") or "{}")
+        percent = max([percent] + [float(value) for value in app_usage.values()])
+
+        # Keyed by business object id; fall back to every entry when ours is absent
+        business_usage = json.loads(headers.get("x-business-use-case-usage") or "{}")
+        entries = business_usage.get(account) or [entry for values in business_usage.values() for entry in values]
+        for entry in entries:
+            for field in ("call_count", "total_cputime", "total_time"):
+                percent = max(percent, float(entry.get(field, 0)))
+            regain_seconds = max(regain_seconds, float(entry.get("estimated_time_to_regain_access", 0)) * 60)
+    except (ValueError, TypeError, AttributeError):
+        pass
+    return percent, regain_seconds
+
+
+class RateGovernor:
+    """
+    Token buckets per (account, endpoint) for Graph API calls.
+
+    Buckets start from the configured budgets and are tightened by the usage
+    headers of every response; the media_publish bucket is seeded from the
+    account's content_publishing_limit. Callers wait for a token when one is
+    due within their wait budget and get RateLimitExceeded otherwise.
+    """
+
+    def __init__(
+        self,
+        calls_per_hour: float = GRAPH_CALLS_PER_HOUR,
+        publish_limit_per_day: float = PUBLISH_LIMIT_PER_DAY,
+        max_wait: float = RATE_LIMIT_MAX_WAIT
+    ):
+        self.calls_per_hour = calls_per_hour
+        self.publish_limit_per_day = publish_limit_per_day
+        self.max_wait = max_wait
+        self._buckets: Dict[Tuple[str, str], TokenBucket] = {}
+        self._quota_synced: Dict[str, float] = {}
+        self._lock = threading.Lock()
+
+    def bucket(self, account: str, endpoint: str) -> TokenBucket:
+        key = (account, endpoint)
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            if endpoint == PUBLISH_ENDPOINT:
+                bucket = TokenBucket(self.publish_limit_per_day, 86400)
+            else:
+                bucket = TokenBucket(self.calls_per_hour, 3600)
+            self._buckets[key] = bucket
+        return bucket
+
+    def check(self, account: str, endpoint: str, max_wait: Optional[float] = None):
+        """
+        Fail fast without taking a token when none is due within the wait budget
+
+        Raises:
+            RateLimitExceeded
+        """
+        max_wait = self.max_wait if max_wait is None else max_wait
+        with self._lock:
+            wait = self.bucket(account, endpoint).wait_time(time.monotonic())
+        if wait > max_wait:
+            raise RateLimitExceeded(account, endpoint, wait)
+
+    async def acquire(self, account: str, endpoint: str, max_wait: Optional[float] = None):
+        """
+        Take a token, waiting up to `max_wait` seconds for one
+
+        Raises:
+            RateLimitExceeded: no token is due within the wait budget
+        """
+        max_wait = self.max_wait if max_wait is None else max_wait
+        deadline = time.monotonic() + max_wait
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                bucket = self.bucket(account, endpoint)
+                wait = bucket.wait_time(now)
+                if wait <= 0:
+                    bucket.take()
+                    return
+            if now + wait > deadline:
+                raise RateLimitExceeded(account, endpoint, wait)
+            await asyncio.sleep(wait)
+
+    def observe(self, account: str, endpoint: str, response: httpx.Response):
+        """
+        Tighten the bucket from a response's usage headers and throttling errors
+        """
+        percent, regain_seconds = usage_percent(response.headers, account)
+        throttled = response.status_code == 429
+        try:
+            throttled = throttled or response.json().get("error", {}).get("code") in THROTTLE_ERROR_CODES
+        except ValueError:
+            pass
+
+        with self._lock:
+            bucket = self.bucket(account, endpoint)
+            if percent:
+                bucket.limit_to(bucket.capacity * (1 - percent / 100))
+            if throttled:
+                bucket.limit_to(0)
+            if regain_seconds:
+                bucket.block_for(regain_seconds)
+
+    async def sync_publish_quota(self, account: str, access_token: str, force: bool = False):
+        """
+        Seed the media_publish bucket from content_publishing_limit, at most
+        once per PUBLISH_QUOTA_REFRESH unless forced
+        """
+        if not force and time.monotonic() - self._quota_synced.get(account, float("-inf")) < PUBLISH_QUOTA_REFRESH:
+            return
+
+        await self.acquire(account, "content_publishing_limit")
+        response = await get_http_client().get(
+            f"{GRAPH_API_URL}/{account}/content_publishing_limit",
+            params={"fields": "quota_usage,config", "access_token": access_token}
+        )
+        self.observe(account, "content_publishing_limit", response)
+        data = (response.json().get("data") or [{}])[0]
+        if "quota_usage" not in data:
+            return
+
+        config = data.get("config", {})
+        quota_total = float(config.get("quota_total", self.publish_limit_per_day))
+        quota_duration = float(config.get("quota_duration", 86400))
+        with self._lock:
+            bucket = self.bucket(account, PUBLISH_ENDPOINT)
+            if bucket.capacity != quota_total:
+                bucket = self._buckets[(account, PUBLISH_ENDPOINT)] = TokenBucket(quota_total, quota_duration)
+            bucket.limit_to(quota_total - float(data["quota_usage"]))
+            self._quota_synced[account] = time.monotonic()
+
+
+rate_governor = RateGovernor()
@@ -0,0 +1,96 @@
+import os
+from typing import List, Optional
+import numpy as np
+from dotenv import load_dotenv
+
+load_dotenv()
+
+FRAME_MS = 30
+# Frames with RMS below this (16-bit sample units) count as silence
+SILENCE_RMS = float(os.getenv("SPEECH_SILENCE_RMS", "500"))
+# A segment closes after this much continuous silence
+MIN_SILENCE_MS = int(os.getenv("SPEECH_MIN_SILENCE_MS", "600"))
+# Segments with less speech than this are dropped (clicks, breaths)
+MIN_SPEECH_MS = int(os.getenv("SPEECH_MIN_SPEECH_MS", "250"))
+# Long uninterrupted speech is cut here so latency stays bounded
+MAX_SEGMENT_MS = int(os.getenv("SPEECH_MAX_SEGMENT_MS", "15000"))
+
+
+class SilenceSegmenter:
+    """
+    Splits a stream of mono 16-bit little-endian PCM into utterances on silence.
+
+    Audio is cut into fixed frames and each frame's RMS decides speech vs
+    silence. A segment starts at the first speech frame and closes after
+    MIN_SILENCE_MS of silence or at MAX_SEGMENT_MS; leading silence is dropped.
+    Chunks may be any size, including odd byte counts.
+    """
+
+    def __init__(
+        self,
+        sample_rate: int,
+        silence_rms: float = SILENCE_RMS,
+        min_silence_ms: int = MIN_SILENCE_MS,
+        min_speech_ms: int = MIN_SPEECH_MS,
+        max_segment_ms: int = MAX_SEGMENT_MS
+    ):
+        self.sample_rate = sample_rate
+        self.silence_rms = silence_rms
+        self.frame_bytes = int(sample_rate * FRAME_MS / 1000) * 2
+        self.min_silence_frames = max(1, min_silence_ms // FRAME_MS)
+        self.min_speech_frames = max(1, min_speech_ms // FRAME_MS)
+        self.max_segment_frames = max(1, max_segment_ms // FRAME_MS)
+        self._leftover = b""
+        self._frames: List[bytes] = []
+        self._speech_frames = 0
+        self._silent_run = 0
+
+    def feed(self, chunk: bytes) -> List[bytes]:
+        """
+        Add PCM bytes
+
+        Returns:
+            PCM of every segment closed by this chunk
+        """
+        data = self._leftover + chunk
+        usable = len(data) - len(data) % self.frame_bytes
+        self._leftover = data[usable:]
+        if not usable:
+            return []
+
+        samples = np.frombuffer(data[:usable], dtype="<i2").astype(np.float32)
+        rms = np.sqrt(np.mean(samples.reshape(-1, self.frame_bytes // 2) ** 2, axis=1))
+
+        closed = []
+        for index, voiced in enumerate(rms >= self.silence_rms):
+            if voiced:
+                self._speech_frames += 1
+                self._silent_run = 0
+            elif self._speech_frames:
+                self._silent_run += 1
+            else:
+                continue
+
+            self._frames.append(data[index * self.frame_bytes:(index + 1) * self.frame_bytes])
+            if self._silent_run >= self.min_silence_frames or len(self._frames) >= self.max_segment_frames:
+                segment = self._close()
+                if segment:
+                    closed.append(segment)
+        return closed
+
+    def flush(self) -> Optional[bytes]:
+        """
+        Close the open segment at end of stream
+        """
+        tail = self._leftover[:len(self._leftover) - len(self._leftover) % 2]
+        if self._speech_frames and tail:
+            self._frames.append(tail)
+        self._leftover = b""
+        return self._close()
+
+    def _close(self) -> Optional[bytes]:
+        frames, speech_frames = self._frames, self._speech_frames
+        self._frames, self._speech_frames, self._silent_run = [], 0, 0
+        if speech_frames < self.min_speech_frames:
+            return None
+        return b"".join(frames)
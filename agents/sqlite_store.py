@@ -0,0 +1,59 @@
+import os
+import time
+import sqlite3
+import threading
+from typing import Callable, Optional, TypeVar
+
+T = TypeVar("T")
+
+
+class SQLiteStore:
+    """
+    Base of the local SQLite stores: one WAL-mode connection shared by the
+    event loop and worker threads, serialized by a lock. Subclasses create
+    their tables after calling __init__.
+    """
+
+    # Table written by update(); keyed by an `id` column and stamped with `updated_at`
+    TABLE = ""
+
+    def __init__(self, db_path: str):
+        self.db_path = db_path
+        db_dir = os.path.dirname(self.db_path)
+        if db_dir:
+            os.makedirs(db_dir, exist_ok=True)
+
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.db_path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+
+    def update(self, row_id: str, **fields):
+        """
+        Set the given columns of one row of TABLE and bump its updated_at
+        """
+        fields["updated_at"] = int(time.time())
+        assignments = ", ".join(f"{column} = ?" for column in fields)
+        with self._lock:
+            self._conn.execute(f"UPDATE {self.TABLE} SET {assignments} WHERE id = ?", (*fields.values(), row_id))
+            self._conn.commit()
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+def process_wide(factory: Callable[[], T]) -> Callable[[], T]:
+    """
+    Getter for a process-wide instance built by factory on first use
+    """
+    instance: Optional[T] = None
+    lock = threading.Lock()
+
+    def get() -> T:
+        nonlocal instance
+        with lock:
+            if instance is None:
+                instance = factory()
+            return instance
+
+    return get
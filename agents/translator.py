@@ -1,13 +1,11 @@
-import io
 import os
-import tempfile
 import speech_recognition as sr
-from gtts import gTTS
 import google.generativeai as genai
 from dotenv import load_dotenv
-from playsound import playsound
 from google.adk.agents import Agent
 from google.adk.tools import FunctionTool
+from .tts_cache import tts_cache
+from .upload_registry import open_source
 
 # ----------------------------------------------------------
 # LOAD ENV VARIABLES
@@ -55,6 +53,51 @@ FALLBACK_MAP = {
     "kok-IN": "mr-IN",
 }
 
+# ----------------------------------------------------------
+# SPEECH HELPERS
+# ----------------------------------------------------------
+def resolve_language(lang_code: str) -> str:
+    """
+    Map dialects without recognizer support to their fallback language
+    """
+    if lang_code in FALLBACK_MAP:
+        print(f"⚠️ Using fallback {FALLBACK_MAP[lang_code]} for {lang_code}")
+        return FALLBACK_MAP[lang_code]
+    return lang_code
+
+
+def recognize_speech(audio: sr.AudioData, lang_code: str) -> str:
+    """
+    Speech-to-text in the given language (raises sr.UnknownValueError on unintelligible audio)
+    """
+    detected_text = sr.Recognizer().recognize_google(audio, language=lang_code)
+    print(f"🗣️ Recognized: {detected_text}")
+    return detected_text
+
+
+def recognize_pcm(pcm: bytes, sample_rate: int, lang_code: str) -> str:
+    """
+    Speech-to-text for raw mono 16-bit PCM
+    """
+    return recognize_speech(sr.AudioData(pcm, sample_rate, 2), lang_code)
+
+
+def translate_text(text: str, lang_code: str) -> str:
+    """
+    Translate recognized text into English with Gemini
+    """
+    model = genai.GenerativeModel("gemini-2.0-flash")
+    prompt = (
+        f"Translate the following {LANGUAGES.get(lang_code, lang_code)} text into fluent English:\n\n"
+        f"{text}\n\n"
+        f"Output only the English translation."
+    )
+    response = model.generate_content(prompt)
+    english_translation = response.text.strip()
+    print(f"🌍 English Translation: {english_translation}")
+    return english_translation
+
+
 # ----------------------------------------------------------
 # FUNCTION TOOL
 # ----------------------------------------------------------
@@ -63,46 +106,34 @@ def translator_run(audio_path: str, lang_code: str) -> dict:
     Translates spoken input in the selected Indian language into English text and audio.
     
     Args:
-        audio_path: Path to input WAV audio file
+        audio_path: Path to input WAV audio file, or an upload handle ("upload://...")
         lang_code: Source language code (e.g., 'hi-IN', 'mr-IN')
 
     Returns:
-        dict: Detected text, translated text
+        dict: Detected text, translated text, and the id/URL of the English audio
     """
     try:
-        if lang_code in FALLBACK_MAP:
-            print(f"⚠️ Using fallback {FALLBACK_MAP[lang_code]} for {lang_code}")
-            lang_code = FALLBACK_MAP[lang_code]
+        lang_code = resolve_language(lang_code)
 
         recognizer = sr.Recognizer()
-        with sr.AudioFile(audio_path) as source:
+        with open_source(audio_path) as audio_file, sr.AudioFile(audio_file) as source:
             audio = recognizer.record(source)
 
         # Step 1: Recognize speech
-        detected_text = recognizer.recognize_google(audio, language=lang_code)
-        print(f"🗣️ Recognized: {detected_text}")
+        detected_text = recognize_speech(audio, lang_code)
 
         # Step 2: Translate with Gemini
-        model = genai.GenerativeModel("gemini-2.0-flash")
-        prompt = (
-            f"Translate the following {LANGUAGES.get(lang_code, lang_code)} text into fluent English:\n\n"
-            f"{detected_text}\n\n"
-            f"Output only the English translation."
-        )
-        response = model.generate_content(prompt)
-        english_translation = response.text.strip()
-        print(f"🌍 English Translation: {english_translation}")
-
-        # Step 3: Convert translation to speech (in memory)
-        tts = gTTS(text=english_translation, lang="en")
-        temp_audio = tempfile.NamedTemporaryFile(delete=True, suffix=".mp3")
-        tts.save(temp_audio.name)
-        playsound(temp_audio.name)  # plays directly, not stored permanently
+        english_translation = translate_text(detected_text, lang_code)
+
+        # Step 3: English speech is synthesized when the client fetches audio_url
+        audio_id = tts_cache.register(english_translation, "en")
 
         return {
             "status": "success",
             "detected_text": detected_text,
             "english_translation": english_translation,
+            "audio_id": audio_id,
+            "audio_url": f"/translator/audio/{audio_id}",
         }
 
     except sr.UnknownValueError:
@@ -126,7 +157,7 @@ You should:
 1. Recognize the speech in the selected Indian language.
 2. Translate it fluently into English using Gemini.
 3. Output both detected and translated text.
-4. Play the English translation audio locally (do not save files permanently).
+4. Return the audio URL of the English translation.
 """,
     description="Translates spoken Indian language audio into English using Gemini.",
     tools=[translator_tool],
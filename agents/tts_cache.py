@@ -0,0 +1,72 @@
+import os
+import hashlib
+from typing import Iterator, Optional, Tuple
+from gtts import gTTS
+from dotenv import load_dotenv
+from .ttl_cache import TTLCache
+
+load_dotenv()
+
+TTS_CACHE_SIZE = int(os.getenv("TTS_CACHE_SIZE", "512"))
+TTS_CACHE_TTL = float(os.getenv("TTS_CACHE_TTL", "86400"))
+
+
+class TTSCache:
+    """
+    Text-keyed cache of synthesized speech.
+
+    register() only records the text and returns its audio id, so nothing is
+    synthesized on the request that produced the text. The clip is
+    synthesized when first fetched and served from memory afterwards; the
+    same phrase always maps to the same id, so repeats skip synthesis.
+    """
+
+    def __init__(self, maxsize: int = TTS_CACHE_SIZE, ttl: float = TTS_CACHE_TTL):
+        self._texts = TTLCache(maxsize=maxsize, ttl=ttl)
+        self._audio = TTLCache(maxsize=maxsize, ttl=ttl)
+
+    @staticmethod
+    def audio_id(text: str, lang: str = "en") -> str:
+        normalized = " ".join(text.split())
+        return hashlib.sha256(f"{lang}\0{normalized}".encode("utf-8")).hexdigest()[:32]
+
+    def register(self, text: str, lang: str = "en") -> str:
+        audio_id = self.audio_id(text, lang)
+        self._texts.set(audio_id, (text, lang))
+        return audio_id
+
+    def text(self, audio_id: str) -> Optional[Tuple[str, str]]:
+        return self._texts.get(audio_id)
+
+    def get_audio(self, audio_id: str) -> Optional[bytes]:
+        return self._audio.get(audio_id)
+
+    def stream(self, audio_id: str) -> Optional[Iterator[bytes]]:
+        """
+        MP3 chunks for a registered id: the cached clip, or live synthesis that
+        yields each chunk as gTTS produces it and caches the full clip at the end.
+        None for unknown or expired ids.
+        """
+        audio = self._audio.get(audio_id)
+        if audio is not None:
+            return iter([audio])
+
+        entry = self._texts.get(audio_id)
+        if entry is None:
+            return None
+        text, lang = entry
+
+        def synthesize() -> Iterator[bytes]:
+            chunks = []
+            for chunk in gTTS(text=text, lang=lang).stream():
+                chunks.append(chunk)
+                yield chunk
+            self._audio.set(audio_id, b"".join(chunks))
+
+        return synthesize()
+
+    def stats(self):
+        return {"texts": len(self._texts), "audio": self._audio.stats()}
+
+
+tts_cache = TTSCache()
@@ -0,0 +1,100 @@
+import os
+import time
+import asyncio
+import hashlib
+from typing import Awaitable, Callable, Dict, Optional, Tuple
+from dotenv import load_dotenv
+from .sqlite_store import SQLiteStore, process_wide
+
+load_dotenv()
+
+DEFAULT_DB_PATH = os.getenv("UPLOAD_CACHE_DB_PATH", os.path.join("data", "uploads.db"))
+
+
+def upload_cache_key(data: bytes, target: str) -> str:
+    """
+    Content address of an upload: SHA-256 of the original bytes plus the
+    settings they are re-encoded with, so changing the target re-uploads
+    """
+    digest = hashlib.sha256(target.encode("utf-8"))
+    digest.update(b"\0")
+    digest.update(data)
+    return digest.hexdigest()
+
+
+class UploadCache(SQLiteStore):
+    """
+    Persistent content-addressed index of Cloudinary uploads (key -> secure_url).
+
+    Identical bytes are uploaded once; later posts, retries and reposts reuse
+    the stored URL. Concurrent uploads of the same key on the event loop are
+    coalesced into a single upload.
+    """
+
+    def __init__(self, db_path: Optional[str] = None):
+        super().__init__(db_path or DEFAULT_DB_PATH)
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS uploads (
+                key TEXT PRIMARY KEY,
+                secure_url TEXT NOT NULL,
+                public_id TEXT NOT NULL DEFAULT '',
+                created_at INTEGER NOT NULL
+            )
+        """)
+        self._conn.commit()
+        self._inflight: Dict[str, asyncio.Task] = {}
+
+    def get(self, key: str) -> Optional[str]:
+        with self._lock:
+            row = self._conn.execute("SELECT secure_url FROM uploads WHERE key = ?", (key,)).fetchone()
+            return row[0] if row else None
+
+    def set(self, key: str, secure_url: str, public_id: str = ""):
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO uploads (key, secure_url, public_id, created_at) VALUES (?, ?, ?, ?)",
+                (key, secure_url, public_id, int(time.time()))
+            )
+            self._conn.commit()
+
+    def delete(self, key: str):
+        """
+        Forget an upload, e.g. after the asset was removed from Cloudinary
+        """
+        with self._lock:
+            self._conn.execute("DELETE FROM uploads WHERE key = ?", (key,))
+            self._conn.commit()
+
+    async def _upload(self, key: str, upload: Callable[[], Awaitable[dict]]) -> str:
+        upload_result = await upload()
+        secure_url = upload_result.get("secure_url")
+        if not secure_url:
+            raise Exception("Cloudinary upload failed.")
+        await asyncio.to_thread(self.set, key, secure_url, upload_result.get("public_id", ""))
+        return secure_url
+
+    async def get_or_upload(self, key: str, upload: Callable[[], Awaitable[dict]]) -> Tuple[str, bool]:
+        """
+        Return the secure_url stored for `key`, calling `upload` (which returns
+        the Cloudinary upload response) only when nothing is stored or in flight
+
+        Returns:
+            (secure_url, reused) - reused is False only for the caller whose
+            upload actually ran
+        """
+        secure_url = await asyncio.to_thread(self.get, key)
+        if secure_url:
+            return secure_url, True
+
+        task = self._inflight.get(key)
+        reused = task is not None
+        if task is None:
+            task = asyncio.ensure_future(self._upload(key, upload))
+            self._inflight[key] = task
+            task.add_done_callback(lambda _: self._inflight.pop(key, None))
+
+        # One caller going away must not cancel the upload for the others
+        return await asyncio.shield(task), reused
+
+
+get_upload_cache: Callable[[], UploadCache] = process_wide(UploadCache)
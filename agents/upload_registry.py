@@ -0,0 +1,82 @@
+import os
+import threading
+from contextlib import contextmanager
+from typing import BinaryIO, Dict, Iterator
+
+HANDLE_PREFIX = "upload://"
+
+
+class UploadRegistry:
+    """
+    In-process registry that hands out string handles ("upload://<id><ext>")
+    for uploaded file objects.
+
+    Tool functions receive the handle in place of a filesystem path (it also
+    survives being passed through an agent prompt) and read the bytes
+    straight from the registered file object, so uploads are never written
+    to a named temp file.
+    """
+
+    def __init__(self):
+        self._uploads: Dict[str, BinaryIO] = {}
+        self._lock = threading.Lock()
+
+    def register(self, fileobj: BinaryIO, filename: str = "") -> str:
+        """
+        Register an open binary file object and return its handle. Pass the
+        handle to tool functions (or an agent prompt) instead of a path - the
+        bytes stay in the caller's file object, no temp file is written.
+        The caller keeps ownership of the file object and must release the
+        handle once the tool is done, typically in a finally block.
+        """
+        ext = os.path.splitext(filename)[1].lower()
+        handle = f"{HANDLE_PREFIX}{os.urandom(8).hex()}{ext}"
+        with self._lock:
+            self._uploads[handle] = fileobj
+        return handle
+
+    def get(self, handle: str) -> BinaryIO:
+        with self._lock:
+            fileobj = self._uploads.get(handle)
+        if fileobj is None:
+            raise FileNotFoundError(f"Upload not found: {handle}")
+        return fileobj
+
+    def release(self, handle: str):
+        with self._lock:
+            self._uploads.pop(handle, None)
+
+    def __contains__(self, handle: str) -> bool:
+        with self._lock:
+            return handle in self._uploads
+
+
+upload_registry = UploadRegistry()
+
+
+def is_upload_handle(path: str) -> bool:
+    return bool(path) and path.startswith(HANDLE_PREFIX)
+
+
+def source_exists(path: str) -> bool:
+    """
+    True for a registered upload handle or an existing file path
+    """
+    if is_upload_handle(path):
+        return path in upload_registry
+    return bool(path) and os.path.exists(path)
+
+
+@contextmanager
+def open_source(path: str) -> Iterator[BinaryIO]:
+    """
+    Open an upload handle or a filesystem path for binary reading, positioned at the start.
+    Registered uploads are left open for their owner.
+    """
+    if is_upload_handle(path):
+        fileobj = upload_registry.get(path)
+        fileobj.seek(0)
+        yield fileobj
+    else:
+        with open(path, "rb") as fileobj:
+            yield fileobj
@@ -1,9 +1,62 @@
+import os
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
+from starlette.formparsers import MultiPartParser
 from routes.caption_router import router as caption_router
 from routes.insta_router import router as instagram_router
 from routes.translator_router import router as translate_router
 from routes.best_time_router import router as best_time_router
-app = FastAPI(title="Instagram Pipeline API")
+from agents.best_time_analyzer import BestTimeAnalyzer
+from agents.best_time_precomputer import BestTimePrecomputer
+from agents.http_client import close_http_client
+from agents.image_preprocessor import shutdown_pool, start_pool
+from agents.instagram_ingester import InstagramIngester, get_engagement_store
+from agents.post_queue import PostQueue
+from agents.post_scheduler import PostScheduler
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # One analyzer (with its Gemini model) for the whole process; outbound HTTP
+    # goes through the shared pooled client of this event loop
+    app.state.best_time_analyzer = BestTimeAnalyzer()
+
+    # Image preprocessing workers, started before any request needs them
+    start_pool()
+
+    # Keep the local engagement store fresh in the background
+    ingester = InstagramIngester(get_engagement_store())
+    ingester.start()
+
+    # Keep recommendations for registered hot keys warm
+    app.state.best_time_precomputer = BestTimePrecomputer(app.state.best_time_analyzer)
+    app.state.best_time_precomputer.start()
+
+    # Background posting jobs, resuming any left unfinished by the last run
+    app.state.post_queue = PostQueue()
+    await app.state.post_queue.start()
+
+    # Hand scheduled posts to the queue when they come due
+    app.state.post_scheduler = PostScheduler(app.state.post_queue)
+    await app.state.post_scheduler.start()
+
+    # Routers look these up on app.state; without the lifespan (e.g. a bare
+    # TestClient) their dependencies get None and answer 503 or skip the feature
+    yield
+    await app.state.post_scheduler.stop()
+    await app.state.post_queue.stop()
+    await app.state.best_time_precomputer.stop()
+    await ingester.stop()
+    await close_http_client()
+    shutdown_pool()
+
+
+# Multipart uploads stay in memory up to this size and then spool to an
+# anonymous temp file. Kept near Starlette's 1 MB default so a batch of
+# large photos does not sit in RAM.
+MultiPartParser.spool_max_size = int(os.getenv("UPLOAD_SPOOL_MAX_BYTES", str(2 * 1024 * 1024)))
+
+app = FastAPI(title="Instagram Pipeline API", lifespan=lifespan)
 
 # Include Routers
 app.include_router(caption_router)
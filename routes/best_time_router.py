@@ -1,7 +1,14 @@
-from fastapi import APIRouter, HTTPException
+import os
+from fastapi import APIRouter, Depends, HTTPException, Request
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
 from typing import List, Optional
-from agents.best_time_analyzer import BestTimeAnalyzer
+from agents.best_time_analyzer import BestTimeAnalyzer, gemini_cache
+from agents.best_time_precomputer import BestTimePrecomputer
+from routes.sse import sse_event
+
+# Upper bound on products per batch request
+MAX_BATCH_SIZE = int(os.getenv("BEST_TIME_MAX_BATCH_SIZE", "500"))
 
 router = APIRouter(prefix="/analytics", tags=["Best Time Analytics"])
 
@@ -11,15 +18,37 @@ class BestTimeRequest(BaseModel):
     keywords: List[str]
     hashtags: Optional[List[str]] = None
 
+def get_analyzer(request: Request) -> BestTimeAnalyzer:
+    """
+    Process-wide analyzer created in the app lifespan.
+    Tests can swap it via app.dependency_overrides[get_analyzer].
+    """
+    analyzer = getattr(request.app.state, "best_time_analyzer", None)
+    if analyzer is None:
+        # App started without its lifespan - create the shared analyzer lazily
+        analyzer = BestTimeAnalyzer()
+        request.app.state.best_time_analyzer = analyzer
+    return analyzer
+
+def get_precomputer(request: Request) -> Optional[BestTimePrecomputer]:
+    """
+    Precomputed recommendations for hot keys, created in the app lifespan
+    """
+    return getattr(request.app.state, "best_time_precomputer", None)
+
 @router.post("/best-time-to-post")
-async def best_time_to_post(request: BestTimeRequest):
+async def best_time_to_post(
+    request: BestTimeRequest,
+    analyzer: BestTimeAnalyzer = Depends(get_analyzer),
+    precomputer: Optional[BestTimePrecomputer] = Depends(get_precomputer)
+):
     """
     Analyze the best time to post a product on Instagram
     
     Combines:
     - Instagram Graph API engagement data (50% weight)
     - Gemini AI cultural/seasonal insights (30% weight)
-    - Firestore historical performance (20% weight)
+    - Historical performance of our own posts (20% weight)
     
     Example Request:
     {
@@ -41,10 +70,19 @@ async def best_time_to_post(request: BestTimeRequest):
         ...
     }
     """
+    # Registered hot keys are served from the precomputed store (refreshed in the background when stale)
+    if precomputer is not None:
+        precomputed = precomputer.lookup(request.model_dump())
+        if precomputed is not None:
+            return {
+                "status": "success",
+                "data": precomputed["result"],
+                "precomputed": True,
+                "stale": precomputed["stale"]
+            }
+    
     try:
-        analyzer = BestTimeAnalyzer()
-        
-        result = analyzer.analyze(
+        result = await analyzer.analyze_async(
             product_name=request.product_name,
             category=request.category,
             keywords=request.keywords,
@@ -62,15 +100,107 @@ async def best_time_to_post(request: BestTimeRequest):
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Analysis failed: {str(e)}")
 
+@router.post("/best-time-to-post/stream")
+async def best_time_to_post_stream(
+    request: BestTimeRequest,
+    analyzer: BestTimeAnalyzer = Depends(get_analyzer),
+    precomputer: Optional[BestTimePrecomputer] = Depends(get_precomputer)
+):
+    """
+    Streaming variant of /best-time-to-post using Server-Sent Events
+    
+    Emits one event per data source as soon as it finishes
+    (`instagram`, `gemini`, `history`), then a final `result` event with the
+    combined recommendation. Failures are reported as an `error` event.
+    
+    A registered hot key with a precomputed recommendation gets only the
+    `result` event, with `precomputed` and `stale` set as in /best-time-to-post.
+    """
+    async def event_stream():
+        if precomputer is not None:
+            precomputed = precomputer.lookup(request.model_dump())
+            if precomputed is not None:
+                yield sse_event("result", {
+                    **precomputed["result"],
+                    "precomputed": True,
+                    "stale": precomputed["stale"]
+                })
+                return
+        
+        try:
+            async for source, data in analyzer.analyze_stream_async(
+                product_name=request.product_name,
+                category=request.category,
+                keywords=request.keywords,
+                hashtags=request.hashtags
+            ):
+                yield sse_event(source, data)
+        except Exception as e:
+            yield sse_event("error", {"detail": f"Analysis failed: {str(e)}"})
+    
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+@router.post("/best-time-to-post/batch")
+async def best_time_to_post_batch(requests: List[BestTimeRequest], analyzer: BestTimeAnalyzer = Depends(get_analyzer)):
+    """
+    Analyze the best time to post for many products in one request
+    
+    Instagram engagement is fetched once for the account, history once per
+    category, and Gemini analyses run concurrently. Results are returned in
+    the same order as the request list.
+    
+    Example Request:
+    [
+        {"product_name": "Brass Ganesh Idol", "category": "Spiritual Items", "keywords": ["brass", "ganesh"]},
+        {"product_name": "Terracotta Pots", "category": "Home Decor", "keywords": ["terracotta", "clay"]}
+    ]
+    """
+    if not requests:
+        raise HTTPException(status_code=400, detail="No products provided")
+    
+    if len(requests) > MAX_BATCH_SIZE:
+        raise HTTPException(status_code=400, detail=f"Batch size exceeds limit of {MAX_BATCH_SIZE}")
+    
+    try:
+        results = await analyzer.analyze_batch_async([request.model_dump() for request in requests])
+        
+        return {
+            "status": "success",
+            "count": len(results),
+            "data": results
+        }
+        
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Batch analysis failed: {str(e)}")
+
+@router.post("/best-time-to-post/hot-keys")
+async def register_hot_key(request: BestTimeRequest, precomputer: Optional[BestTimePrecomputer] = Depends(get_precomputer)):
+    """
+    Register a frequently requested product for background precomputation.
+    Its recommendation is kept warm and served without waiting on external APIs.
+    """
+    if precomputer is None:
+        raise HTTPException(status_code=503, detail="Precomputation is not running")
+    
+    created = precomputer.register(request.model_dump())
+    
+    return {
+        "status": "success",
+        "registered": created,
+        "hot_keys": len(precomputer.registered())
+    }
+
 @router.get("/test")
-async def test_best_time():
+async def test_best_time(analyzer: BestTimeAnalyzer = Depends(get_analyzer)):
     """
     Test endpoint with sample data
     """
     try:
-        analyzer = BestTimeAnalyzer()
-        
-        result = analyzer.analyze(
+        result = await analyzer.analyze_async(
             product_name="Brass Ganesh Idol",
             category="Spiritual Items",
             keywords=["brass", "ganesh", "idol", "statue", "handcrafted"],
@@ -85,3 +215,13 @@ async def test_best_time():
         
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Test failed: {str(e)}")
+
+@router.get("/cache-stats")
+async def cache_stats():
+    """
+    Hit/miss counters for the Gemini analysis cache
+    """
+    return {
+        "status": "success",
+        "gemini_cache": gemini_cache.stats()
+    }
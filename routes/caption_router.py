@@ -1,16 +1,30 @@
 import os
-import tempfile
-from fastapi import APIRouter, UploadFile, HTTPException
+import asyncio
+from typing import List
+from fastapi import APIRouter, UploadFile, File, Form, HTTPException
+from fastapi.responses import StreamingResponse
 from google.adk.runners import Runner
 from google.adk.sessions import InMemorySessionService
 from google.genai import types
-from agents.caption_generator import caption_generator_agent
+from agents.upload_registry import upload_registry
+from agents.caption_cache import caption_cache
+from agents.caption_generator import (
+    caption_generator_agent, generate_captions, load_vision_image, parse_captions, stream_captions
+)
+from routes.execution_mode import check_execution_mode, default_execution_mode
+from routes.sse import sse_event
 
 router = APIRouter(prefix="/instagram", tags=["Caption Generator"])
 
 APP_NAME = "instagram_pipeline"
 USER_ID = "user123"
 
+DEFAULT_EXECUTION_MODE = default_execution_mode("CAPTION_EXECUTION_MODE")
+
+# Batch captioning: max images per request and max concurrent Gemini calls across batches
+MAX_BATCH_FILES = int(os.getenv("CAPTION_BATCH_MAX_FILES", "250"))
+batch_semaphore = asyncio.Semaphore(int(os.getenv("CAPTION_BATCH_CONCURRENCY", "8")))
+
 session_service = InMemorySessionService()
 runner = Runner(
     agent=caption_generator_agent, 
@@ -19,24 +33,25 @@ runner = Runner(
 )
 
 @router.post("/caption")
-async def generate_caption(file: UploadFile):
+async def generate_caption(file: UploadFile, mode: str = Form(DEFAULT_EXECUTION_MODE)):
     if not file:
         raise HTTPException(status_code=400, detail="No file uploaded")
     
+    check_execution_mode(mode)
+    
     # Validate file type
     if not file.content_type.startswith('image/'):
         raise HTTPException(status_code=400, detail="File must be an image")
     
-    temp_path = None
+    upload_handle = None
     try:
-        # Save uploaded file temporarily
-        filename = file.filename or "upload.jpg"
-        ext = os.path.splitext(filename)[1] or ".jpg"
+        upload_handle = upload_registry.register(file.file, file.filename or "upload.jpg")
 
-        with tempfile.NamedTemporaryFile(delete=False, suffix=ext) as temp_file:
-            content = await file.read()
-            temp_file.write(content)
-            temp_path = temp_file.name
+        if mode == "direct":
+            result = await asyncio.to_thread(generate_captions, upload_handle)
+            if not result["captions"]:
+                raise HTTPException(status_code=500, detail=result.get("error", "Failed to generate captions"))
+            return {"captions": result["captions"], "status": "success"}
 
         # Create unique session ID for each request
         session_id = f"session_{os.urandom(8).hex()}"
@@ -49,7 +64,7 @@ async def generate_caption(file: UploadFile):
         # Send message to agent with the image path
         message = types.Content(
             role="user", 
-            parts=[types.Part(text=f"Generate Instagram captions for the image at: {temp_path}")]
+            parts=[types.Part(text=f"Generate Instagram captions for the image at: {upload_handle}")]
         )
         
         captions = []
@@ -64,20 +79,114 @@ async def generate_caption(file: UploadFile):
             if event.is_final_response():
                 # Extract captions from response
                 response_text = event.content.parts[0].text
-                captions = [opt.strip() for opt in response_text.split("\n\n") if opt.strip()][:3]
+                captions = parse_captions(response_text)
 
         if not captions:
             raise HTTPException(status_code=500, detail="Failed to generate captions")
 
         return {"captions": captions, "status": "success"}
 
+    except HTTPException:
+        raise
+
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error processing image: {str(e)}")
     
     finally:
-        # Clean up temporary file
-        if temp_path and os.path.exists(temp_path):
-            try:
-                os.remove(temp_path)
-            except:
-                pass
\ No newline at end of file
+        if upload_handle:
+            upload_registry.release(upload_handle)
+
+
+async def caption_one(file: UploadFile) -> dict:
+    """Caption a single image of a batch; failures are reported per item."""
+    filename = file.filename or "upload.jpg"
+    
+    if not file.content_type or not file.content_type.startswith('image/'):
+        return {"filename": filename, "status": "error", "error": "File must be an image"}
+    
+    upload_handle = upload_registry.register(file.file, filename)
+    try:
+        async with batch_semaphore:
+            result = await asyncio.to_thread(generate_captions, upload_handle)
+        
+        if not result["captions"]:
+            return {"filename": filename, "status": "error", "error": result.get("error", "Failed to generate captions")}
+        
+        return {"filename": filename, "status": "success", "captions": result["captions"]}
+    
+    except Exception as e:
+        return {"filename": filename, "status": "error", "error": str(e)}
+    
+    finally:
+        upload_registry.release(upload_handle)
+
+
+@router.post("/caption/batch")
+async def generate_caption_batch(files: List[UploadFile] = File(...)):
+    """
+    Generate captions for many images in one multipart request.
+    Images are captioned concurrently (CAPTION_BATCH_CONCURRENCY); results are
+    returned in upload order and a failed image doesn't fail the batch.
+    """
+    if not files:
+        raise HTTPException(status_code=400, detail="No files uploaded")
+    
+    if len(files) > MAX_BATCH_FILES:
+        raise HTTPException(status_code=400, detail=f"Batch exceeds limit of {MAX_BATCH_FILES} images")
+    
+    results = await asyncio.gather(*(caption_one(file) for file in files))
+    
+    return {
+        "status": "success",
+        "count": len(results),
+        "succeeded": sum(1 for result in results if result["status"] == "success"),
+        "results": results
+    }
+
+
+@router.post("/caption/stream")
+async def generate_caption_stream(file: UploadFile):
+    """
+    Streaming caption generation over Server-Sent Events.
+    Emits a `caption` event for each option as soon as the model finishes it,
+    then a `done` event with all captions (or an `error` event).
+    """
+    if not file:
+        raise HTTPException(status_code=400, detail="No file uploaded")
+    
+    if not file.content_type.startswith('image/'):
+        raise HTTPException(status_code=400, detail="File must be an image")
+    
+    # Prepare the image before responding - the upload is closed once the handler returns
+    upload_handle = upload_registry.register(file.file, file.filename or "upload.jpg")
+    try:
+        img = await asyncio.to_thread(load_vision_image, upload_handle)
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=f"Error processing image: {str(e)}")
+    finally:
+        upload_registry.release(upload_handle)
+    
+    def event_stream():
+        captions = []
+        try:
+            # Sync generator - Starlette iterates it in a worker thread
+            for caption in stream_captions(img):
+                captions.append(caption)
+                yield sse_event("caption", {"index": len(captions), "caption": caption})
+            if not captions:
+                raise ValueError("Failed to generate captions")
+            yield sse_event("done", {"captions": captions, "status": "success"})
+        except Exception as e:
+            yield sse_event("error", {"detail": str(e)})
+    
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
+@router.get("/caption/cache-stats")
+async def caption_cache_stats():
+    """Hit/miss counters for the perceptual-hash caption cache."""
+    return {"status": "success", "caption_cache": caption_cache.stats()}
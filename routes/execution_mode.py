@@ -0,0 +1,23 @@
+import os
+from typing import Sequence
+from fastapi import HTTPException
+
+# "direct" calls the tool function itself; "agent" goes through the ADK runner (extra LLM round trip).
+# Routers may add their own modes (e.g. "queue" on /instagram/post)
+EXECUTION_MODES = ("direct", "agent")
+
+
+def default_execution_mode(env_var: str) -> str:
+    """
+    Router's default mode from env_var. "agent" when unset so existing
+    clients keep their response fields; "direct" is opt-in
+    """
+    return os.getenv(env_var, "agent")
+
+
+def check_execution_mode(mode: str, modes: Sequence[str] = EXECUTION_MODES):
+    """
+    Reject an unknown mode with a 400
+    """
+    if mode not in modes:
+        raise HTTPException(status_code=400, detail=f"mode must be one of {', '.join(modes)}")
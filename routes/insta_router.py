@@ -1,16 +1,31 @@
 import os
-import tempfile
-from fastapi import APIRouter, UploadFile, Form, HTTPException
+import math
+import asyncio
+from datetime import datetime
+from typing import List, Optional
+from fastapi import APIRouter, Depends, UploadFile, Form, HTTPException, Request
 from google.adk.runners import Runner
 from google.adk.sessions import InMemorySessionService
 from google.genai import types
-from agents.instagram_poster import instagram_poster_agent
+from agents.upload_registry import upload_registry
+from agents.instagram_poster import (
+    MAX_CAROUSEL_ITEMS, instagram_poster_agent, instagram_post_run, publish_carousel, publish_image
+)
+from agents.best_time_analyzer import BestTimeAnalyzer
+from agents.post_queue import PostQueue
+from agents.post_scheduler import POSTING_TIMEZONE, PostScheduler, next_posting_slot
+from routes.best_time_router import get_analyzer
+from routes.execution_mode import EXECUTION_MODES, check_execution_mode, default_execution_mode
 
 router = APIRouter(prefix="/instagram", tags=["Instagram"])
 
 APP_NAME = "instagram_pipeline"
 USER_ID = "user123"
 
+# "queue" returns a job id at once and posts in the background
+INSTAGRAM_EXECUTION_MODES = EXECUTION_MODES + ("queue",)
+DEFAULT_EXECUTION_MODE = default_execution_mode("INSTAGRAM_POST_EXECUTION_MODE")
+
 session_service = InMemorySessionService()
 runner = Runner(
     agent=instagram_poster_agent,
@@ -18,27 +33,65 @@ runner = Runner(
     session_service=session_service
 )
 
+def get_post_queue(request: Request) -> Optional[PostQueue]:
+    """
+    Posting job queue, created in the app lifespan
+    """
+    return getattr(request.app.state, "post_queue", None)
+
+def raise_for_result(result: dict):
+    """
+    Map a failed posting result to an HTTP error: 429 with Retry-After when
+    rate limited, 500 otherwise
+    """
+    if "retry_after" in result:
+        raise HTTPException(
+            status_code=429,
+            detail=result["post_status"],
+            headers={"Retry-After": str(math.ceil(result["retry_after"]))}
+        )
+    if "media_id" not in result:
+        raise HTTPException(status_code=500, detail=result["post_status"])
+
+def get_post_scheduler(request: Request) -> Optional[PostScheduler]:
+    """
+    Scheduled-posting dispatcher, created in the app lifespan
+    """
+    return getattr(request.app.state, "post_scheduler", None)
+
 @router.post("/post")
-async def post_to_instagram(file: UploadFile, caption: str = Form("")):
+async def post_to_instagram(
+    file: UploadFile,
+    caption: str = Form(""),
+    category: str = Form(""),
+    mode: str = Form(DEFAULT_EXECUTION_MODE),
+    post_queue: Optional[PostQueue] = Depends(get_post_queue)
+):
     if not file:
         raise HTTPException(status_code=400, detail="No file uploaded")
     
+    check_execution_mode(mode, INSTAGRAM_EXECUTION_MODES)
+    
     if not file.content_type.startswith('image/'):
         raise HTTPException(status_code=400, detail="File must be an image")
     
-    temp_path = None
+    if mode == "queue":
+        if post_queue is None:
+            raise HTTPException(status_code=503, detail="Post queue is not running")
+        job_id = await post_queue.submit(await file.read(), file.filename or "upload.jpg", caption, category)
+        return {"status": "queued", "job_id": job_id, "status_url": f"/instagram/post/{job_id}"}
+    
+    upload_handle = None
     
     try:
-        # Save uploaded file temporarily
-        filename = file.filename or "upload.jpg"
-        ext = os.path.splitext(filename)[1] or ".jpg"
-        
-        with tempfile.NamedTemporaryFile(delete=False, suffix=ext) as temp_file:
-            content = await file.read()
-            temp_file.write(content)
-            temp_path = temp_file.name
+        upload_handle = upload_registry.register(file.file, file.filename or "upload.jpg")
 
-        print(f"Received file: {temp_path}, Caption: {caption}")
+        print(f"Received file: {upload_handle}, Caption: {caption}")
+
+        if mode == "direct":
+            result = await instagram_post_run(upload_handle, caption, category)
+            raise_for_result(result)
+            return {"status": "success", "details": result}
 
         # Create unique session for this request
         session_id = f"session_{os.urandom(8).hex()}"
@@ -52,7 +105,7 @@ async def post_to_instagram(file: UploadFile, caption: str = Form("")):
         message = types.Content(
             role="user",
             parts=[types.Part(
-                text=f"Post this image to Instagram. Image path: {temp_path}, Caption: {caption}"
+                text=f"Post this image to Instagram. Image path: {upload_handle}, Caption: {caption}, Category: {category}"
             )]
         )
 
@@ -73,15 +126,176 @@ async def post_to_instagram(file: UploadFile, caption: str = Form("")):
 
         return {"status": "success", "details": result}
 
+    except HTTPException:
+        raise
+
     except Exception as e:
         print(f"Error: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Error posting to Instagram: {str(e)}")
 
     finally:
-        # Clean up temporary file
-        if temp_path and os.path.exists(temp_path):
-            try:
-                os.remove(temp_path)
-                print(f"Cleaned up: {temp_path}")
-            except:
-                pass
\ No newline at end of file
+        if upload_handle:
+            upload_registry.release(upload_handle)
+
+
+@router.post("/post/carousel")
+async def post_carousel_to_instagram(
+    files: List[UploadFile],
+    caption: str = Form(""),
+    category: str = Form(""),
+    as_carousel: bool = Form(True)
+):
+    """
+    Post several images at once, uploaded to Cloudinary in parallel.
+    
+    as_carousel=true publishes them as one carousel post (2-10 images);
+    as_carousel=false publishes each image (up to 10) as its own post with
+    the same caption and reports one result per image.
+    """
+    if not files:
+        raise HTTPException(status_code=400, detail="No files uploaded")
+    
+    if as_carousel and len(files) < 2:
+        raise HTTPException(status_code=400, detail=f"A carousel needs 2 to {MAX_CAROUSEL_ITEMS} images")
+    
+    # Bulk posts share the limit: each image is a separate upload and publish
+    if len(files) > MAX_CAROUSEL_ITEMS:
+        raise HTTPException(status_code=400, detail=f"At most {MAX_CAROUSEL_ITEMS} images per request")
+    
+    if any(not file.content_type.startswith('image/') for file in files):
+        raise HTTPException(status_code=400, detail="All files must be images")
+    
+    upload_handles = []
+    
+    try:
+        for file in files:
+            upload_handles.append(upload_registry.register(file.file, file.filename or "upload.jpg"))
+        
+        if as_carousel:
+            result = await publish_carousel(upload_handles, caption, category)
+            raise_for_result(result)
+            return {"status": "success", "details": result}
+        
+        results = await asyncio.gather(*(
+            publish_image(upload_handle, caption, category) for upload_handle in upload_handles
+        ))
+        posted = sum("media_id" in result for result in results)
+        
+        return {
+            "status": "success" if posted == len(results) else "partial" if posted else "failed",
+            "posted": posted,
+            "details": results
+        }
+    
+    except HTTPException:
+        raise
+    
+    except Exception as e:
+        print(f"Error: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Error posting to Instagram: {str(e)}")
+    
+    finally:
+        for upload_handle in upload_handles:
+            upload_registry.release(upload_handle)
+
+
+@router.get("/post/{job_id}")
+async def get_post_job(job_id: str, post_queue: Optional[PostQueue] = Depends(get_post_queue)):
+    """
+    Status of a queued post: status (queued, running, succeeded, failed),
+    current stage, and the post result once finished
+    """
+    if post_queue is None:
+        raise HTTPException(status_code=503, detail="Post queue is not running")
+    
+    job = await post_queue.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Post job not found: {job_id}")
+    
+    return {"job_id": job.pop("id"), **job}
+
+
+@router.post("/schedule")
+async def schedule_post(
+    file: UploadFile,
+    caption: str = Form(""),
+    category: str = Form(""),
+    publish_at: Optional[str] = Form(None),
+    product_name: str = Form(""),
+    keywords: str = Form(""),
+    scheduler: Optional[PostScheduler] = Depends(get_post_scheduler),
+    analyzer: BestTimeAnalyzer = Depends(get_analyzer)
+):
+    """
+    Schedule a post for later.
+    
+    With publish_at (ISO 8601; POSTING_TIMEZONE when no offset is given) the
+    post goes out at that time. Otherwise the best time is analyzed for
+    product_name, category and comma-separated keywords, and the post goes
+    out at the next slot matching the recommendation.
+    """
+    if scheduler is None:
+        raise HTTPException(status_code=503, detail="Post scheduler is not running")
+    
+    if not file.content_type.startswith('image/'):
+        raise HTTPException(status_code=400, detail="File must be an image")
+    
+    best_time_to_post = ""
+    if publish_at:
+        try:
+            publish_time = datetime.fromisoformat(publish_at)
+        except ValueError:
+            raise HTTPException(status_code=400, detail="publish_at must be an ISO 8601 datetime")
+        if publish_time.tzinfo is None:
+            publish_time = publish_time.replace(tzinfo=POSTING_TIMEZONE)
+    else:
+        if not product_name or not category:
+            raise HTTPException(status_code=400, detail="Provide publish_at, or product_name and category")
+        
+        recommendation = await analyzer.analyze_async(
+            product_name=product_name,
+            category=category,
+            keywords=[keyword.strip() for keyword in keywords.split(",") if keyword.strip()]
+        )
+        best_time_to_post = recommendation.get("best_time_to_post", "")
+        publish_time = next_posting_slot(best_time_to_post)
+    
+    schedule_id = await scheduler.schedule(
+        await file.read(), file.filename or "upload.jpg", caption, category, publish_time, best_time_to_post
+    )
+    
+    return {
+        "status": "scheduled",
+        "schedule_id": schedule_id,
+        "publish_at": publish_time.isoformat(),
+        "best_time_to_post": best_time_to_post,
+        "status_url": f"/instagram/schedule/{schedule_id}"
+    }
+
+
+@router.get("/schedule/{schedule_id}")
+async def get_scheduled_post(schedule_id: str, scheduler: Optional[PostScheduler] = Depends(get_post_scheduler)):
+    """
+    Status of a scheduled post: scheduled, dispatching, dispatched (with the
+    posting job_id to poll at /instagram/post/{job_id}), cancelled or failed
+    """
+    if scheduler is None:
+        raise HTTPException(status_code=503, detail="Post scheduler is not running")
+    
+    post = await scheduler.get(schedule_id)
+    if post is None:
+        raise HTTPException(status_code=404, detail=f"Scheduled post not found: {schedule_id}")
+    
+    post["publish_at"] = datetime.fromtimestamp(post["publish_at"], POSTING_TIMEZONE).isoformat()
+    return {"schedule_id": post.pop("id"), **post}
+
+
+@router.delete("/schedule/{schedule_id}")
+async def cancel_scheduled_post(schedule_id: str, scheduler: Optional[PostScheduler] = Depends(get_post_scheduler)):
+    if scheduler is None:
+        raise HTTPException(status_code=503, detail="Post scheduler is not running")
+    
+    if not await scheduler.cancel(schedule_id):
+        raise HTTPException(status_code=409, detail="Post is not scheduled (already dispatched, cancelled or unknown)")
+    
+    return {"status": "cancelled", "schedule_id": schedule_id}
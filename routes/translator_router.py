@@ -1,16 +1,28 @@
 import os
-import tempfile
-from fastapi import APIRouter, UploadFile, Form, HTTPException
+import json
+import asyncio
+import speech_recognition as sr
+from fastapi import APIRouter, UploadFile, Form, HTTPException, Query, WebSocket, WebSocketDisconnect
+from fastapi.responses import StreamingResponse
 from google.adk.runners import Runner
 from google.adk.sessions import InMemorySessionService
 from google.genai import types
-from agents.translator import translator_agent
+from agents.upload_registry import upload_registry
+from agents.speech_segmenter import SilenceSegmenter
+from agents.translator import recognize_pcm, resolve_language, translate_text, translator_agent, translator_run
+from agents.tts_cache import tts_cache
+from routes.execution_mode import check_execution_mode, default_execution_mode
 
 router = APIRouter(prefix="/translator", tags=["Speech Translator"])
 
 APP_NAME = "speech_translator"
 USER_ID = "user123"
 
+DEFAULT_EXECUTION_MODE = default_execution_mode("TRANSLATOR_EXECUTION_MODE")
+
+# Recognition/translation calls in flight per streaming connection
+STREAM_SEGMENT_CONCURRENCY = int(os.getenv("TRANSLATOR_STREAM_CONCURRENCY", "3"))
+
 session_service = InMemorySessionService()
 runner = Runner(
     agent=translator_agent,
@@ -20,22 +32,26 @@ runner = Runner(
 
 
 @router.post("/translate")
-async def translate_audio(file: UploadFile, lang_code: str = Form(...)):
+async def translate_audio(file: UploadFile, lang_code: str = Form(...), mode: str = Form(DEFAULT_EXECUTION_MODE)):
     """Accepts an uploaded audio file + language code and returns the English translation."""
     if not file:
         raise HTTPException(status_code=400, detail="No file uploaded")
     
+    check_execution_mode(mode)
+    
     if not file.content_type.startswith("audio/"):
         raise HTTPException(status_code=400, detail="File must be an audio file")
 
-    temp_path = None
+    upload_handle = None
 
     try:
-        # Save uploaded file temporarily
-        with tempfile.NamedTemporaryFile(delete=False, suffix=".wav") as temp_file:
-            content = await file.read()
-            temp_file.write(content)
-            temp_path = temp_file.name
+        upload_handle = upload_registry.register(file.file, file.filename or "upload.wav")
+
+        if mode == "direct":
+            result = await asyncio.to_thread(translator_run, upload_handle, lang_code)
+            if result["status"] != "success":
+                raise HTTPException(status_code=500, detail=result["message"])
+            return {"status": "success", "translation": result}
 
         # Create a new session for this translation request
         session_id = f"session_{os.urandom(8).hex()}"
@@ -49,7 +65,7 @@ async def translate_audio(file: UploadFile, lang_code: str = Form(...)):
             role="user",
             parts=[
                 types.Part(
-                    text=f"Translate this audio into English. Audio path: {temp_path}, Language: {lang_code}"
+                    text=f"Translate this audio into English. Audio path: {upload_handle}, Language: {lang_code}"
                 )
             ]
         )
@@ -69,12 +85,134 @@ async def translate_audio(file: UploadFile, lang_code: str = Form(...)):
 
         return {"status": "success", "translation": result}
 
+    except HTTPException:
+        raise
+
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error translating audio: {str(e)}")
 
     finally:
-        if temp_path and os.path.exists(temp_path):
+        if upload_handle:
+            upload_registry.release(upload_handle)
+
+
+# Declared before /audio/{audio_id} so it isn't captured as an id
+@router.get("/audio/cache-stats")
+async def tts_cache_stats():
+    """Hit/miss counters for the TTS audio cache."""
+    return {"status": "success", "tts_cache": tts_cache.stats()}
+
+
+@router.get("/audio/{audio_id}")
+async def get_translation_audio(audio_id: str):
+    """
+    English speech (MP3) for a translation's audio_id. Synthesized and
+    streamed on first request, then served from the TTS cache.
+    """
+    chunks = tts_cache.stream(audio_id)
+    if chunks is None:
+        raise HTTPException(status_code=404, detail="Audio not found or expired")
+    
+    # Synchronous iterator - Starlette pulls gTTS chunks in its threadpool
+    return StreamingResponse(chunks, media_type="audio/mpeg")
+
+
+@router.websocket("/stream")
+async def stream_translation(
+    websocket: WebSocket,
+    lang_code: str = Query(...),
+    sample_rate: int = Query(16000)
+):
+    """
+    Live speech translation.
+    
+    The client sends binary frames of mono 16-bit little-endian PCM at
+    `sample_rate` while recording, then {"type": "end"}. Audio is split on
+    silence; each segment is recognized and translated as soon as it
+    closes. Per segment, in order, the server sends
+    {"type": "transcript", "segment", "text"} and then
+    {"type": "translation", "segment", "text"} (or {"type": "error", ...}),
+    and finally {"type": "done", "segments"}.
+    """
+    await websocket.accept()
+    
+    if not 8000 <= sample_rate <= 48000:
+        await websocket.close(code=1008, reason="sample_rate must be between 8000 and 48000")
+        return
+    
+    lang_code = resolve_language(lang_code)
+    segmenter = SilenceSegmenter(sample_rate)
+    semaphore = asyncio.Semaphore(STREAM_SEGMENT_CONCURRENCY)
+    # (recognition, translation) tasks per segment, in arrival order
+    pending: asyncio.Queue = asyncio.Queue()
+    tasks = []
+    
+    def start_segment(pcm: bytes):
+        async def recognize() -> str:
+            async with semaphore:
+                return await asyncio.to_thread(recognize_pcm, pcm, sample_rate, lang_code)
+        
+        async def translate(recognition: asyncio.Task) -> str:
+            detected_text = await recognition
+            async with semaphore:
+                return await asyncio.to_thread(translate_text, detected_text, lang_code)
+        
+        recognition = asyncio.ensure_future(recognize())
+        translation = asyncio.ensure_future(translate(recognition))
+        tasks.extend((recognition, translation))
+        pending.put_nowait((recognition, translation))
+    
+    async def send_results() -> int:
+        index = 0
+        while True:
+            item = await pending.get()
+            if item is None:
+                return index
+            recognition, translation = item
             try:
-                os.remove(temp_path)
-            except:
-                pass
+                await websocket.send_json({"type": "transcript", "segment": index, "text": await recognition})
+                await websocket.send_json({"type": "translation", "segment": index, "text": await translation})
+            except sr.UnknownValueError:
+                await websocket.send_json({"type": "error", "segment": index, "message": "Could not understand audio."})
+            except Exception as e:
+                await websocket.send_json({"type": "error", "segment": index, "message": str(e)})
+            # Retrieve the translation's outcome when recognition already failed
+            await asyncio.gather(translation, return_exceptions=True)
+            index += 1
+    
+    sender = asyncio.ensure_future(send_results())
+    
+    try:
+        while True:
+            message = await websocket.receive()
+            if message["type"] == "websocket.disconnect":
+                raise WebSocketDisconnect(message.get("code", 1000))
+            
+            if message.get("bytes"):
+                for pcm in segmenter.feed(message["bytes"]):
+                    start_segment(pcm)
+            elif message.get("text"):
+                try:
+                    control = json.loads(message["text"])
+                except ValueError:
+                    control = {}
+                if isinstance(control, dict) and control.get("type") == "end":
+                    break
+        
+        final_segment = segmenter.flush()
+        if final_segment:
+            start_segment(final_segment)
+        pending.put_nowait(None)
+        
+        segments = await sender
+        await websocket.send_json({"type": "done", "segments": segments})
+        await websocket.close()
+    
+    except WebSocketDisconnect:
+        print("Translation stream client disconnected")
+    
+    finally:
+        sender.cancel()
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(sender, *tasks, return_exceptions=True)
@@ -57,6 +57,59 @@ def test_custom_product():
     else:
         print(f"Error: {response.text}\n")
 
+def test_batch_endpoint():
+    """Test batch analysis for several products"""
+    print("\n🔍 Testing /analytics/best-time-to-post/batch...")
+    
+    payload = [
+        {
+            "product_name": "Brass Ganesh Idol",
+            "category": "Spiritual Items",
+            "keywords": ["brass", "ganesh", "idol"]
+        },
+        {
+            "product_name": "Hand-painted Terracotta Pots",
+            "category": "Home Decor",
+            "keywords": ["terracotta", "handmade", "clay"]
+        },
+        {
+            "product_name": "Terracotta Wall Plate",
+            "category": "Home Decor",
+            "keywords": ["terracotta", "wall", "decor"]
+        }
+    ]
+    
+    response = requests.post(
+        f"{BASE_URL}/analytics/best-time-to-post/batch",
+        json=payload
+    )
+    
+    print(f"Status: {response.status_code}")
+    
+    if response.status_code == 200:
+        for result in response.json().get("data", []):
+            print(f"⏰ {result.get('product')}: {result.get('best_time_to_post')}")
+        print()
+    else:
+        print(f"Error: {response.text}\n")
+
+def test_stream_endpoint():
+    """Test Server-Sent Events streaming of partial results"""
+    print("\n🔍 Testing /analytics/best-time-to-post/stream...")
+    
+    payload = {
+        "product_name": "Brass Ganesh Idol",
+        "category": "Spiritual Items",
+        "keywords": ["brass", "ganesh", "idol"]
+    }
+    
+    with requests.post(f"{BASE_URL}/analytics/best-time-to-post/stream", json=payload, stream=True) as response:
+        print(f"Status: {response.status_code}")
+        for line in response.iter_lines(decode_unicode=True):
+            if line.startswith("event:"):
+                print(f"📨 {line[len('event:'):].strip()}")
+    print()
+
 if __name__ == "__main__":
     print("=" * 60)
     print("🧪 API ENDPOINT TESTING")
@@ -68,6 +121,8 @@ if __name__ == "__main__":
         test_root()
         test_best_time_endpoint()
         test_custom_product()
+        test_batch_endpoint()
+        test_stream_endpoint()
         
         print("=" * 60)
         print("✅ All tests completed!")
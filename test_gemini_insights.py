@@ -0,0 +1,72 @@
+"""
+Checks for the structured Gemini analysis used by the best-time analyzer
+Run this after setting up your .env file
+"""
+import json
+import google.generativeai as genai
+from google.generativeai.types.generation_types import to_generation_config_dict
+from agents.best_time_analyzer import BestTimeAnalyzer, GEMINI_GENERATION_CONFIG, GeminiInsights, gemini_cache
+
+
+def test_generation_config_converts():
+    print("🧪 Building the Gemini request with the GeminiInsights schema")
+
+    # What generate_content does before anything is sent
+    model = genai.GenerativeModel('gemini-2.0-flash-exp')
+    request = model._prepare_request(
+        contents="ping", generation_config=GEMINI_GENERATION_CONFIG,
+        safety_settings=None, tools=None, tool_config=None
+    )
+
+    assert request.generation_config.response_mime_type == "application/json"
+    assert set(request.generation_config.response_schema.properties) == set(GeminiInsights.__annotations__)
+    print("✅ Generation config converts")
+
+
+class RecordingModel:
+    """
+    Stands in for the Gemini model: converts the config like the SDK does
+    and answers with a valid GeminiInsights document
+    """
+
+    def __init__(self):
+        self.calls = 0
+
+    def generate_content(self, prompt, generation_config=None):
+        to_generation_config_dict(generation_config)
+        self.calls += 1
+        insights = {
+            "best_days": ["Friday", "Saturday"],
+            "best_time_slots": ["7:00pm-9:00pm"],
+            "target_states": ["Rajasthan"],
+            "season_spike": ["Diwali"],
+            "festivals": ["Diwali"],
+            "expected_demand_boost": "+60%",
+            "reasoning": "Festival gifting."
+        }
+        return type("Response", (), {"text": json.dumps(insights)})()
+
+
+def test_successful_analysis_is_cached():
+    print("🧪 Caching a successful Gemini analysis")
+
+    gemini_cache.clear()
+    model = RecordingModel()
+    analyzer = BestTimeAnalyzer(gemini_model=model)
+
+    first = analyzer.analyze_with_gemini("Brass Diya", "Festival Decor", ["brass", "diya"])
+    assert "error" not in first, first
+    assert len(gemini_cache) == 1
+
+    hits = gemini_cache.hits
+    # Case, spacing and keyword order don't split the cache
+    second = analyzer.analyze_with_gemini("brass  diya", "Festival Decor", ["diya", "Brass"])
+    assert second == first
+    assert model.calls == 1
+    assert gemini_cache.hits == hits + 1
+    print("✅ Second call served from the cache")
+
+
+if __name__ == "__main__":
+    test_generation_config_converts()
+    test_successful_analysis_is_cached()
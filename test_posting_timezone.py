@@ -0,0 +1,47 @@
+"""
+Check that a best-time slot derived from Instagram engagement is scheduled
+at the UTC moment the engagement actually happened
+Run this after setting up your .env file
+"""
+from datetime import datetime, timedelta, timezone
+from agents.best_time_analyzer import BestTimeAnalyzer
+from agents.post_scheduler import POSTING_TIMEZONE, next_posting_slot
+
+
+def test_instagram_slot_utc_moment():
+    print("=" * 60)
+    print(f"🧪 Testing Instagram-derived slots ({POSTING_TIMEZONE.key})")
+    print("=" * 60)
+
+    analyzer = BestTimeAnalyzer()
+
+    # Friday posts: engagement peaks at 13:00 UTC, earlier posts get little
+    peak = datetime(2026, 10, 16, 13, 0, tzinfo=timezone.utc)
+    media = [
+        {"timestamp": int((peak - timedelta(weeks=week)).timestamp()), "like_count": 500,
+         "comments_count": 50, "saved": 20, "caption": "#brass"}
+        for week in range(4)
+    ] + [
+        {"timestamp": int((peak - timedelta(weeks=week, hours=5)).timestamp()), "like_count": 10,
+         "comments_count": 1, "saved": 0, "caption": "#brass"}
+        for week in range(4)
+    ]
+
+    insta_data = analyzer._summarize_engagement(media, [], "engagement_store")
+    result = analyzer.compute_best_time(insta_data, {}, {}, "Brass Ganesh Idol", "Spiritual Items")
+    print(f"⏰ Best Time: {result['best_time_to_post']}")
+
+    slot = next_posting_slot(result["best_time_to_post"], now=peak - timedelta(days=2))
+    slot_utc = slot.astimezone(timezone.utc)
+    print(f"📅 Scheduled: {slot.isoformat()} ({slot_utc.isoformat()})")
+
+    # The slot starts the POSTING_TIMEZONE hour that contains the peak
+    peak_hour_start = peak.astimezone(POSTING_TIMEZONE).replace(minute=0, second=0)
+    assert slot == peak_hour_start, f"expected {peak_hour_start.isoformat()}, got {slot.isoformat()}"
+    assert slot_utc <= peak < slot_utc + timedelta(hours=1)
+
+    print("✅ Slot matches the engagement peak in UTC")
+
+
+if __name__ == "__main__":
+    test_instagram_slot_utc_moment()